@@ -8,7 +8,7 @@ from typing import Dict
 from pysmt.fnode import FNode
 
 from theorydd.formula import get_atoms
-from theorydd.util._string_generator import SequentialStringGenerator
+from theorydd.util._string_generator import generate_strings
 
 
 class AbstractDD(ABC):
@@ -27,12 +27,9 @@ class AbstractDD(ABC):
         start_time = time.time()
         self.logger.info("Creating mapping...")
         atoms = get_atoms(phi)
-        string_generator = SequentialStringGenerator()
-        mapping = {}
-        for atom in atoms:
-            mapping[atom] = string_generator.next_string()
+        mapping = dict(zip(atoms, generate_strings(len(atoms))))
         elapsed_time = time.time() - start_time
-        self.logger.info("Mapping created in %s seconds", str(elapsed_time))
+        self.logger.info("Mapping created in %s seconds", elapsed_time)
         computation_logger["variable mapping creation time"] = elapsed_time
         return mapping
 
@@ -3,15 +3,20 @@
 import logging
 import time
 import os
-from typing import Dict, List
+from typing import Dict, Generator, List
 from pysmt.fnode import FNode
-import pydot
 from dd import cudd as cudd_bdd
 from theorydd import formula
 from theorydd.abstractdd.abstractdd import AbstractDD
 from theorydd.solvers.solver import SMTEnumerator
 from theorydd.walkers.walker_bdd import BDDWalker
-from theorydd.util._dd_dump_util import change_bbd_dot_names as _change_bbd_dot_names
+from theorydd.util._dd_dump_util import (
+    change_bbd_dot_names as _change_bbd_dot_names,
+    dot_file_to_svg as _dot_file_to_svg,
+    dot_lines_to_svg as _dot_lines_to_svg,
+    rename_bdd_dot_lines as _rename_bdd_dot_lines,
+    temporary_dot_file as _temporary_dot_file,
+)
 from theorydd.util._utils import cudd_dump as _cudd_dump, cudd_load as _cudd_load, get_solver as _get_solver
 
 
@@ -28,6 +33,7 @@ class AbstractionBDD(AbstractDD):
     bdd: cudd_bdd.BDD
     root: cudd_bdd.Function
     mapping: Dict[FNode, object]
+    refinement: Dict[object, FNode]
 
     def __init__(
         self,
@@ -35,6 +41,7 @@ class AbstractionBDD(AbstractDD):
         solver: str | SMTEnumerator = "total",
         computation_logger: Dict = None,
         folder_name: str | None = None,
+        dynamic_reorder: bool = True,
     ):
         """
         builds an AbstractionBDD
@@ -46,6 +53,8 @@ class AbstractionBDD(AbstractDD):
             computation_logger (Dict) [None]: a dictionary that will be updated to store computation info
             folder_name (str | None) [None]: the path to a folder where data to load the AbstractionBDD is stored.
                 If this is not None, then all other parameters are ignored
+            dynamic_reorder (bool) [True]: if True, CUDD dynamically reorders the variables
+                with group sifting while the Abstraction BDD is built. The initial order is only used as a hint
         """
         super().__init__()
         self.logger = logging.getLogger("theorydd_abstraction_bdd")
@@ -62,32 +71,32 @@ class AbstractionBDD(AbstractDD):
             smt_solver = _get_solver(solver)
         else:
             smt_solver = solver
-        phi = formula.get_normalized(phi, smt_solver.get_converter())
+        phi = smt_solver.get_normalizer().walk(phi)
         elapsed_time = time.time() - start_time
-        self.logger.info("Phi was normalized in %s seconds", str(elapsed_time))
+        self.logger.info("Phi was normalized in %s seconds", elapsed_time)
         computation_logger["Abstraction BDD"]["phi normalization time"] = elapsed_time
 
         # CREATING VARIABLE MAPPING
         self.mapping = self._compute_mapping(phi, computation_logger["Abstraction BDD"])
+        self.refinement = {v: k for k, v in self.mapping.items()}
 
         # BUILDING ACTUAL BDD
-        self._build(phi, computation_logger["Abstraction BDD"])
+        self._build(phi, computation_logger["Abstraction BDD"], dynamic_reorder)
 
-    def _build(self, phi:FNode, computation_logger: Dict):
+    def _build(self, phi:FNode, computation_logger: Dict, dynamic_reorder: bool = True):
         """builds the DD"""
         start_time = time.time()
         self.logger.info("Building Abstraction BDD...")
         self.bdd = cudd_bdd.BDD()
-        all_values = list(self.mapping.values())
-        self.bdd.declare(*all_values)
-        bdd_ordering = {}
-        for i, item in enumerate(all_values):
-            bdd_ordering[item] = i
-        cudd_bdd.reorder(self.bdd, bdd_ordering)
+        # variables are placed at the levels in which they are declared,
+        # so there is no need to reorder the empty manager
+        self.bdd.declare(*self.mapping.values())
+        # CUDD reorders dynamically with group sifting
+        self.bdd.configure(reordering=dynamic_reorder, max_growth=1.2)
         walker = BDDWalker(self.mapping, self.bdd)
         self.root = walker.walk(phi)
         elapsed_time = time.time() - start_time
-        self.logger.info("Abstraction BDD for phi built in %s seconds", str(elapsed_time))
+        self.logger.info("Abstraction BDD for phi built in %s seconds", elapsed_time)
         computation_logger["DD building time"] = elapsed_time
 
     def __len__(self) -> int:
@@ -104,7 +113,7 @@ class AbstractionBDD(AbstractDD):
     def count_models(self) -> int:
         """Returns the amount of models in the Abstraction-BDD"""
         try:
-            total = self.root.count(nvars=len(self.mapping.keys()))
+            total = self.root.count(nvars=len(self.mapping))
         except RuntimeError:
             total = -1
         return total
@@ -122,20 +131,22 @@ class AbstractionBDD(AbstractDD):
                 with the names of the abstraction of the atoms instead of the
                 full names of atoms
         """
-        temporary_dot = "bdd_temporary_dot.dot"
-        reverse_mapping = dict((v, k) for k, v in self.mapping.items())
         if output_file.endswith(".dot"):
             self.bdd.dump(output_file, filetype="dot", roots=[self.root])
             if not dump_abstraction:
-                _change_bbd_dot_names(output_file, reverse_mapping)
+                _change_bbd_dot_names(output_file, self.refinement)
         elif output_file.endswith(".svg"):
-            self.bdd.dump(temporary_dot, filetype="dot", roots=[self.root])
-            if not dump_abstraction:
-                _change_bbd_dot_names(temporary_dot, reverse_mapping)
-            with open(temporary_dot, "r", encoding="utf8") as dot_content:
-                (graph,) = pydot.graph_from_dot_data(dot_content.read())
-                graph.write_svg(output_file)
-            os.remove(temporary_dot)
+            with _temporary_dot_file() as temporary_dot:
+                self.bdd.dump(temporary_dot.name, filetype="dot", roots=[self.root])
+                if dump_abstraction:
+                    _dot_file_to_svg(temporary_dot.name, output_file)
+                else:
+                    # names are replaced while streaming the dot file to Graphviz
+                    with open(temporary_dot.name, "r", encoding="utf8") as dot_lines:
+                        _dot_lines_to_svg(
+                            _rename_bdd_dot_lines(dot_lines, self.refinement),
+                            output_file,
+                        )
         else:
             self.logger.info("Unable to dump BDD file: format not unsupported")
             return
@@ -151,15 +162,20 @@ class AbstractionBDD(AbstractDD):
         return self._convert_assignment(self.root.pick())
 
     def _convert_assignment(self, assignment):
-        inv_map = {v: k for k, v in self.mapping.items()}
-        return {inv_map[var]: truth for var, truth in assignment.items()}
+        refinement = self.refinement
+        return {refinement[var]: truth for var, truth in assignment.items()}
 
     def pick_all(self) -> List[Dict[FNode, bool]]:
         """Returns all partial models of the encoded formula"""
+        return list(self.pick_all_iter())
+
+    def pick_all_iter(self) -> Generator[Dict[FNode, bool], None, None]:
+        """Returns an iterator over all partial models of the encoded formula,
+        converting each of them only when it is reached"""
         if self.root == self.bdd.false:
-            return []
-        items = list(self.bdd.pick_iter(self.root))
-        return [self._convert_assignment(i) for i in items]
+            return
+        for item in self.bdd.pick_iter(self.root):
+            yield self._convert_assignment(item)
 
     def save_to_folder(self, folder_path: str) -> None:
         """Saves the Abstraction BDD to a folder
@@ -167,8 +183,7 @@ class AbstractionBDD(AbstractDD):
         Args:
             folder_path (str): the path to the folder where the BDD will be saved
         """
-        if not os.path.exists(folder_path):
-            os.makedirs(folder_path)
+        os.makedirs(folder_path, exist_ok=True)
         # SAVE MAPPING
         formula.save_abstraction_function(
             self.mapping, f"{folder_path}/abstraction.json"
@@ -183,6 +198,7 @@ class AbstractionBDD(AbstractDD):
             folder_name (str): the path to the folder where the BDD is stored
         """
         self.mapping = formula.load_abstraction_function(f"{folder_path}/abstraction.json")
+        self.refinement = {v: k for k, v in self.mapping.items()}
         self.bdd = cudd_bdd.BDD()
         self.bdd.declare(*self.mapping.values())
         self.root = _cudd_load(f"{folder_path}/abstraction_bdd_data", self.bdd)
@@ -5,7 +5,7 @@ import os
 import time
 from typing import Dict, List, Set
 from pysmt.fnode import FNode
-from pysdd.sdd import SddManager, Vtree, SddNode, WmcManager
+from pysdd.sdd import SddManager, Vtree, SddNode
 from theorydd import formula
 from theorydd.abstractdd.abstractdd import AbstractDD
 from theorydd.solvers.solver import SMTEnumerator
@@ -13,7 +13,7 @@ from theorydd.formula import get_atoms
 from theorydd.walkers.walker_sdd import SDDWalker
 from theorydd.tdd.theory_sdd import vtree_load_from_folder as _vtree_load_from_folder
 from theorydd.util._dd_dump_util import save_sdd_object as _save_sdd_object
-from theorydd.util._utils import get_solver as _get_solver
+from theorydd.util._utils import get_solver as _get_solver, sdd_model_count as _sdd_model_count
 
 
 class AbstractionSDD(AbstractDD):
@@ -68,9 +68,9 @@ class AbstractionSDD(AbstractDD):
             smt_solver = _get_solver(solver)
         else:
             smt_solver = solver
-        phi = formula.get_normalized(phi, smt_solver.get_converter())
+        phi = smt_solver.get_normalizer().walk(phi)
         elapsed_time = time.time() - start_time
-        self.logger.info("Phi was normalized in %s seconds", str(elapsed_time))
+        self.logger.info("Phi was normalized in %s seconds", elapsed_time)
         computation_logger["Abstraction SDD"]["phi normalization time"] = elapsed_time
 
         # CREATING VARIABLE MAPPING
@@ -94,12 +94,13 @@ class AbstractionSDD(AbstractDD):
         start_time = time.time()
         self.logger.info("Building Abstraction SDD...")
         self.manager = SddManager.from_vtree(self.vtree)
-        sdd_literals = [self.manager.literal(i) for i in range(1, len(atoms) + 1)]
+        # the literals are created lazily while zipping them with the atoms
+        sdd_literals = map(self.manager.literal, range(1, len(atoms) + 1))
         atom_literal_map = dict(zip(atoms, sdd_literals))
         walker = SDDWalker(atom_literal_map, self.manager)
         self.root = walker.walk(phi)
         elapsed_time = time.time() - start_time
-        self.logger.info("Abstraction SDD built in %s seconds", str(elapsed_time))
+        self.logger.info("Abstraction SDD built in %s seconds", elapsed_time)
         computation_logger["DD building time"] = elapsed_time
 
     def _build_vtree(
@@ -111,10 +112,10 @@ class AbstractionSDD(AbstractDD):
         start_time = time.time()
         self.logger.info("Building V-Tree...")
         self.refinement = {v: k for k, v in self.abstraction.items()}
-        var_order = list(range(1, len(atoms) + 1))
-        vtree = Vtree(len(atoms), var_order, vtree_type)
+        # the default order of the vtree is 1, ..., var_count
+        vtree = Vtree(var_count=len(atoms), vtree_type=vtree_type)
         elapsed_time = time.time() - start_time
-        self.logger.info("V-Tree built in %s seconds", str(elapsed_time))
+        self.logger.info("V-Tree built in %s seconds", elapsed_time)
         computation_logger["V-Tree building time"] = elapsed_time
         return vtree
 
@@ -129,30 +130,28 @@ class AbstractionSDD(AbstractDD):
         """Returns the number of vertices in the AbstractionSDD"""
         if self.root.is_true() or not self.root.is_decision():
             return 0
-        else:
-            elems = self.root.elements()
-            queue: List[SddNode] = []
-            for elem in elems:
-                queue.extend([elem[0], elem[1]])
-            total_edges = len(elems)
-            visited: Set[SddNode] = set()
-            visited.add(self.root)
-            while len(queue) > 0:
-                first = queue.pop(0)
-                if first.is_decision():
-                    total_edges += 1
-                    if not first in visited:
-                        elems = first.elements()
-                        for elem in elems:
-                            queue.extend([elem[0], elem[1]])
-                            total_edges += 1
-                    visited.add(first)
-            return total_edges
+        # every decision node is expanded once, even if it is shared,
+        # and has an edge to the prime and to the sub of each element.
+        # nodes are visited depth first, so children follow their parent,
+        # and are marked as visited when pushed, so each is pushed only once
+        stack: List[SddNode] = [self.root]
+        visited: Set[SddNode] = {self.root}
+        total_edges = 0
+        while stack:
+            elems = stack.pop().elements()
+            total_edges += 2 * len(elems)
+            for prime, sub in elems:
+                if prime.is_decision() and prime not in visited:
+                    visited.add(prime)
+                    stack.append(prime)
+                if sub.is_decision() and sub not in visited:
+                    visited.add(sub)
+                    stack.append(sub)
+        return total_edges
 
     def count_models(self) -> int:
         """Returns the amount of models in the AbstractionSDD"""
-        wmc: WmcManager = self.root.wmc(log_mode=False)
-        return wmc.propagate()
+        return _sdd_model_count(self.root, self.manager)
 
     def get_mapping(self) -> Dict[FNode, str]:
         """returns the mapping"""
@@ -199,9 +198,8 @@ class AbstractionSDD(AbstractDD):
         Args:
             folder_path (str): the path to the output folder
         """
-        # check if folder exists
-        if not os.path.exists(folder_path):
-            os.makedirs(folder_path)
+        # create the folder if it does not exist
+        os.makedirs(folder_path, exist_ok=True)
         # save vtree
         self.save_vtree_to_folder(folder_path)
         # save mapping
@@ -209,7 +207,7 @@ class AbstractionSDD(AbstractDD):
             self.abstraction, folder_path + "/abstraction.json"
         )
         # save sdd
-        self.root.save(str.encode(folder_path + "/sdd.sdd"))
+        self.root.save(os.fsencode(os.path.join(folder_path, "sdd.sdd")))
 
     def save_vtree_to_folder(self, folder_path: str) -> None:
         """Save the V-Tree in the specified folder
@@ -217,9 +215,8 @@ class AbstractionSDD(AbstractDD):
         Args:
             folder_path (str): the path to the output folder
         """
-        if not os.path.exists(folder_path):
-            os.makedirs(folder_path)
-        self.vtree.save(str.encode(folder_path + "/vtree.vtree"))
+        os.makedirs(folder_path, exist_ok=True)
+        self.vtree.save(os.fsencode(os.path.join(folder_path, "vtree.vtree")))
 
     def _load_from_folder(self, folder_path: str) -> None:
         """
@@ -234,7 +231,7 @@ class AbstractionSDD(AbstractDD):
             )
         self.vtree = _vtree_load_from_folder(folder_path)
         self.manager = SddManager.from_vtree(self.vtree)
-        self.root = self.manager.read_sdd_file(str.encode(f"{folder_path}/sdd.sdd"))
+        self.root = self.manager.read_sdd_file(os.fsencode(os.path.join(folder_path, "sdd.sdd")))
         self.abstraction = formula.load_abstraction_function(
             folder_path + "/abstraction.json"
         )
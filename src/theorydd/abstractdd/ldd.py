@@ -14,7 +14,7 @@ from theorydd.util.custom_exceptions import (
     InvalidLDDTheoryException,
     UnsupportedSymbolException,
 )
-from theorydd.util._string_generator import SequentialStringGenerator
+from theorydd.util._string_generator import generate_strings
 
 
 class LDD:
@@ -68,13 +68,12 @@ class LDD:
         self.logger.info("Finding symbols...")
         symbols = _formula.get_symbols(phi)
         self.total_atoms = len(_formula.get_atoms(phi))
-        boolean_symbols: dict[FNode, str] = {}
+        boolean_atoms = []
         integer_symbols: dict[FNode, int] = {}
         int_ctr = 1
-        str_gen = SequentialStringGenerator()
         for s in symbols:
             if s.get_type() == BOOL:
-                boolean_symbols.update({s: str_gen.next_string()})
+                boolean_atoms.append(s)
             elif s.get_type() == INT:
                 integer_symbols.update({s: int_ctr})
                 int_ctr += 1
@@ -83,8 +82,12 @@ class LDD:
                 int_ctr += 1
             else:
                 raise UnsupportedSymbolException(str(s))
+        # the names of the boolean symbols are generated all at once
+        boolean_symbols: dict[FNode, str] = dict(
+            zip(boolean_atoms, generate_strings(len(boolean_atoms)))
+        )
         elapsed_time = time.time() - start_time
-        self.logger.info("Symbols found in %s seconds", str(elapsed_time))
+        self.logger.info("Symbols found in %s seconds", elapsed_time)
 
         # BUILDING LDD
         self._build(phi, boolean_symbols, integer_symbols, ldd_theory, computation_logger["LDD"])
@@ -99,7 +102,7 @@ class LDD:
         walker = LDDWalker(boolean_symbols, integer_symbols, self.manager)
         self.root = walker.walk(phi)
         elapsed_time = time.time() - start_time
-        self.logger.info("LDD for phi built in %s seconds", str(elapsed_time))
+        self.logger.info("LDD for phi built in %s seconds", elapsed_time)
         computation_logger["DD building time"] = elapsed_time
 
     def __len__(self) -> int:
@@ -23,6 +23,7 @@ BDD_DOT_TRUE_LABEL = '[label="True-1"]'
 BDD_DOT_KEY_START_REGEX = r'"[a-z]*-[0-9]*"]'
 BDD_DOT_KEY_END_REGEX = r'-[0-9]*"]'
 BDD_DOT_REPLACE_REGEX = BDD_DOT_LINE_REGEX
+RE_BDD_DOT_LABEL = re.compile(r'[\[]label="([a-z]*)-[0-9]*"[]]')
 
 BDD_LINE_REGEX = r">[a-z]+&#45;[0-9]+</text>"
 BDD_KEY_START_REGEX = r"[a-z]+&#45;[0-9]+<"
@@ -55,7 +56,15 @@ D4_COMMAND = LIBRARY_PATH + "/bin/d4/d4.bin"
 TABULAR_ALLSMT_COMMAND = LIBRARY_PATH + "/bin/tabular/tabularAllSMT.bin"
 
 # regex for tlemmas files
-TLEMMAS_FILE_REGEX = "tlemma_[0-9]+.smt2"
+TLEMMAS_FILE_REGEX = r"tlemma_[0-9]+\.smt2"
+RE_TLEMMAS_FILE = re.compile(TLEMMAS_FILE_REGEX)
+
+# regex for the model count at the end of the tabular AllSMT output
+TABULAR_MODEL_COUNT_LABEL = b"MODEL COUNT"
+TABULAR_PARTIAL_COUNT_LABEL = b"NUMBER OF PARTIAL ASSIGNMENTS"
+RE_TABULAR_MODEL_COUNT = re.compile(
+    rb"(?:MODEL COUNT|NUMBER OF PARTIAL ASSIGNMENTS)\s+(\d+)"
+)
 
 # D4 NODES
 D4_AND_NODE = 0
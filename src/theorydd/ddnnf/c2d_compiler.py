@@ -20,7 +20,6 @@ from theorydd.constants import (
     UNSAT,
     C2D_COMMAND as _C2D_COMMAND
 )
-from theorydd.formula import get_normalized
 from theorydd.solvers.mathsat_total import MathSATTotalEnumerator
 
 from theorydd.ddnnf.ddnnf_compiler import DDNNFCompiler
@@ -71,7 +70,7 @@ class C2DCompiler(DDNNFCompiler):
         else:
             phi_and_lemmas = _get_phi_and_lemmas(phi, tlemmas)
         # normalize phi and lemmas
-        phi_and_lemmas = get_normalized(phi_and_lemmas, self.normalizing_solver.get_converter())
+        phi_and_lemmas = self.normalizing_solver.get_normalizer().walk(phi_and_lemmas)
         phi_cnf: FNode = LabelCNFizer().convert_as_formula(phi_and_lemmas)
         phi_atoms: frozenset = get_atoms(phi)
         phi_cnf_atoms: frozenset = get_atoms(phi_cnf)
@@ -253,11 +252,10 @@ class C2DCompiler(DDNNFCompiler):
         tmp_folder = self._choose_tmp_folder(save_path)
 
         # translate to CNF DIMACS and get mapping used for translation
-        if not os.path.exists(tmp_folder):
-            os.mkdir(tmp_folder)
+        os.makedirs(tmp_folder, exist_ok=True)
         start_time = time.time()
         self.logger.info("Translating to DIMACS...")
-        phi = get_normalized(phi, self.normalizing_solver.get_converter())
+        phi = self.normalizing_solver.get_normalizer().walk(phi)
         self.from_smtlib_to_dimacs_file(
             phi,
             f"{tmp_folder}/dimacs.cnf",
@@ -267,16 +265,15 @@ class C2DCompiler(DDNNFCompiler):
         )
         elapsed_time = time.time() - start_time
         computation_logger["DIMACS translation time"] = elapsed_time
-        self.logger.info("DIMACS translation completed in %s seconds", str(elapsed_time))
+        self.logger.info("DIMACS translation completed in %s seconds", elapsed_time)
 
         # save mapping for refinement
         start_time = time.time()
-        if not os.path.exists(f"{tmp_folder}/mapping"):
-            os.mkdir(f"{tmp_folder}/mapping")
+        os.makedirs(f"{tmp_folder}/mapping", exist_ok=True)
         self.logger.info("Saving refinement...")
         save_refinement(self.refinement, f"{tmp_folder}/mapping/mapping.json")
         elapsed_time = time.time() - start_time
-        self.logger.info("Refinement saved in %s seconds", str(elapsed_time))
+        self.logger.info("Refinement saved in %s seconds", elapsed_time)
         computation_logger["refinement serialization time"] = elapsed_time
 
         # call c2d for compilation
@@ -296,7 +293,7 @@ class C2DCompiler(DDNNFCompiler):
             raise TimeoutError("c2d compilation failed: timeout")
         elapsed_time = time.time() - start_time
         computation_logger["dDNNF compilation time"] = elapsed_time
-        self.logger.info("dDNNF compilation completed in %s seconds", str(elapsed_time))
+        self.logger.info("dDNNF compilation completed in %s seconds", elapsed_time)
 
         # return if not back to fnode
         if not back_to_fnode:
@@ -314,7 +311,7 @@ class C2DCompiler(DDNNFCompiler):
             self._clean_tmp_folder(tmp_folder)
         elapsed_time = time.time() - start_time
         computation_logger["pysmt translation time"] = elapsed_time
-        self.logger.info("Pysmt translation completed in %s seconds", str(elapsed_time))
+        self.logger.info("Pysmt translation completed in %s seconds", elapsed_time)
         return result, nodes, edges
 
     def load_dDNNF(self, nnf_path: str, mapping_path: str) -> FNode:
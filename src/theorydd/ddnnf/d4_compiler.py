@@ -1,7 +1,6 @@
 """midddleware for pysmt-d4 compatibility"""
 
 
-import json
 import logging
 import os
 import time
@@ -17,7 +16,7 @@ from pysmt.shortcuts import (
 )
 from pysmt.fnode import FNode
 from allsat_cnf.label_cnfizer import LabelCNFizer
-from theorydd.formula import save_refinement, load_refinement, get_phi_and_lemmas, get_normalized
+from theorydd.formula import save_refinement, load_refinement, get_phi_and_lemmas, json_dumps
 from theorydd.constants import (
     UNSAT,
     D4_COMMAND as _D4_COMMAND,
@@ -138,7 +137,7 @@ class D4Compiler(DDNNFCompiler):
             phi_and_lemmas = get_phi_and_lemmas(phi, tlemmas)
         else:
             phi_and_lemmas = phi
-        phi_and_lemmas = get_normalized(phi_and_lemmas, self.normalizer_solver.get_converter())
+        phi_and_lemmas = self.normalizer_solver.get_normalizer().walk(phi_and_lemmas)
         phi_cnf: FNode = LabelCNFizer().convert_as_formula(phi_and_lemmas)
         phi_cnf_atoms: frozenset = get_atoms(phi_cnf)
         fresh_atoms: Set[FNode] = frozenset(
@@ -308,27 +307,25 @@ class D4Compiler(DDNNFCompiler):
         tmp_folder = self._choose_tmp_folder(save_path)
 
         # translate to CNF DIMACS and get mapping used for translation
-        if not os.path.exists(tmp_folder):
-            os.mkdir(tmp_folder)
+        os.makedirs(tmp_folder, exist_ok=True)
         start_time = time.time()
         self.logger.info("Translating to DIMACS...")
-        phi = get_normalized(phi, self.normalizer_solver.get_converter())
+        phi = self.normalizer_solver.get_normalizer().walk(phi)
         self.from_smtlib_to_dimacs_file(
             phi, f"{tmp_folder}/dimacs.cnf", tlemmas, sat_result=sat_result)
         elapsed_time = time.time() - start_time
         computation_logger["DIMACS translation time"] = elapsed_time
-        self.logger.info("DIMACS translation completed in %s seconds", str(elapsed_time))
+        self.logger.info("DIMACS translation completed in %s seconds", elapsed_time)
 
         # save mapping for refinement
         start_time = time.time()
-        if not os.path.exists(f"{tmp_folder}/mapping"):
-            os.mkdir(f"{tmp_folder}/mapping")
+        os.makedirs(f"{tmp_folder}/mapping", exist_ok=True)
         self.logger.info("Saving refinement...")
         save_refinement(self.refinement, f"{tmp_folder}/mapping/mapping.json")
-        with open(f"{tmp_folder}/mapping/important_labels.json", "w", encoding="utf8") as f:
-            json.dump(self.important_atoms_labels, f)
+        with open(f"{tmp_folder}/mapping/important_labels.json", "wb") as f:
+            f.write(json_dumps(self.important_atoms_labels))
         elapsed_time = time.time() - start_time
-        self.logger.info("Refinement saved in %s seconds", str(elapsed_time))
+        self.logger.info("Refinement saved in %s seconds", elapsed_time)
         computation_logger["refinement serialization time"] = elapsed_time
 
         # call d4 for compilation
@@ -347,7 +344,7 @@ class D4Compiler(DDNNFCompiler):
             raise TimeoutError("d4 compilation failed: timeout")
         elapsed_time = time.time() - start_time
         computation_logger["dDNNF compilation time"] = elapsed_time
-        self.logger.info("dDNNF compilation completed in %s seconds", str(elapsed_time))
+        self.logger.info("dDNNF compilation completed in %s seconds", elapsed_time)
 
         # fix output
         self._fix_ddnnf(f"{tmp_folder}/compilation_output.nnf", get_atoms(phi))
@@ -370,7 +367,7 @@ class D4Compiler(DDNNFCompiler):
             self._clean_tmp_folder(tmp_folder)
         elapsed_time = time.time() - start_time
         computation_logger["pysmt translation time"] = elapsed_time
-        self.logger.info("pysmt translation completed in %s seconds", str(elapsed_time))
+        self.logger.info("pysmt translation completed in %s seconds", elapsed_time)
         return phi_ddnnf, nodes, edges
 
     def load_dDNNF(self, nnf_path: str, mapping_path: str) -> FNode:
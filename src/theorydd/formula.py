@@ -1,5 +1,6 @@
 """this module simplifies interactions with the pysmt library for handling SMT formulas"""
 
+import heapq
 from io import StringIO
 import json
 import os
@@ -15,20 +16,42 @@ from pysmt.shortcuts import (
     LT as _LT,
     Not as _Not,
     read_smtlib as _read_smtlib,
-    write_smtlib as _write_smtlib,
     TRUE as _TRUE,
     FALSE as _FALSE,
 )
 from pysmt.fnode import FNode
+from pysmt.oracles import SizeOracle as _SizeOracle
 from pysmt.smtlib.script import smtlibscript_from_formula as _script_from_formula
-from pysmt.smtlib.parser.parser import get_formula as _get_formula
-from theorydd.util._string_generator import SequentialStringGenerator
+from pysmt.smtlib.parser.parser import (
+    get_formula as _get_formula,
+    SmtLibParser as _SmtLibParser,
+)
+from theorydd.util._string_generator import generate_strings
 
 from theorydd.util.custom_exceptions import FormulaException
 from theorydd.util.disjoint_set import DisjointSet
 from theorydd.walkers.normalizer import NormalizerWalker
 from theorydd.walkers.duoble_negation_walker import DoubleNegWalker
 
+# orjson is used to read and write mapping files when it is installed
+try:
+    import orjson as _orjson
+except ImportError:
+    _orjson = None
+
+# buffer size used when writing SMT-LIB files
+_SMT_FILE_BUFFER_SIZE = 1 << 20
+
+# above this amount of work, counted over the scoring of the atoms
+# and over the whole elimination with its fill-in,
+# the min-fill ordering keeps the atoms in their given order
+_MIN_FILL_MAX_WORK = 2_000_000
+
+# the max-reduction ordering substitutes and simplifies every remaining atom
+# in phi at each step, so it keeps the atoms in their given order above these bounds
+_MAX_REDUCTION_MAX_ATOMS = 50
+_MAX_REDUCTION_MAX_WORK = 200_000
+
 
 def default_phi() -> FNode:
     """Returns a default SMT formula's root FNode:
@@ -97,7 +120,42 @@ def save_phi(phi: FNode, filename: str) -> None:
     # pylint: disable=unused-argument
     if not isinstance(filename, str):
         raise TypeError("Expected str found " + str(type(filename)))
-    _write_smtlib(phi, filename)
+    script = _script_from_formula(phi)
+    with open(
+        filename, "w", buffering=_SMT_FILE_BUFFER_SIZE, encoding="utf8"
+    ) as out:
+        script.serialize(out)
+
+
+def serialize_phi(phi: FNode) -> str:
+    """Serializes the formula phi into a SMT-LIB script
+
+    Args:
+        phi (FNode): a pysmt formula
+
+    Returns:
+        str: the SMT-LIB script encoding phi
+    """
+    if not isinstance(phi, FNode):
+        raise TypeError("Expected FNode found " + str(type(phi)))
+    script = _script_from_formula(phi)
+    output_stream = StringIO()
+    script.serialize(output_stream)
+    return output_stream.getvalue()
+
+
+def deserialize_phi(serialized_phi: str) -> FNode:
+    """Reads a formula from a SMT-LIB script produced by serialize_phi
+
+    Args:
+        serialized_phi (str): the SMT-LIB script encoding the formula
+
+    Returns:
+        FNode: the pysmt formula encoded in the script
+    """
+    if not isinstance(serialized_phi, str):
+        raise TypeError("Expected str found " + str(type(serialized_phi)))
+    return _get_formula(StringIO(serialized_phi))
 
 
 def get_atoms(phi: FNode) -> List[FNode]:
@@ -114,6 +172,222 @@ def get_atoms(phi: FNode) -> List[FNode]:
     return list(phi.get_atoms())
 
 
+def get_atoms_dfs_order(
+    phi: FNode, atoms: Iterable[FNode] | None = None
+) -> List[FNode]:
+    """Returns the atoms of phi in the order in which a depth-first
+    traversal of phi reaches them for the first time, so that atoms
+    that appear in the same subformulas get close positions
+
+    Args:
+        phi (FNode): a pysmt formula
+        atoms (Iterable[FNode] | None) [None]: the atoms of phi, if already known
+
+    Returns:
+        List[FNode]: the atoms in the formula
+    """
+    if not isinstance(phi, FNode):
+        raise TypeError("Expected FNode found " + str(type(phi)))
+    if atoms is None:
+        atoms = phi.get_atoms()
+    atoms_set = set(atoms)
+    ordered_atoms: List[FNode] = []
+    visited: Set[FNode] = set()
+    stack = [phi]
+    while len(stack) > 0:
+        node = stack.pop()
+        if node in visited:
+            continue
+        visited.add(node)
+        if node in atoms_set:
+            ordered_atoms.append(node)
+            continue
+        # push in reverse so that arguments are visited left to right
+        stack.extend(reversed(node.args()))
+    if len(ordered_atoms) < len(atoms_set):
+        ordered_atoms.extend(atoms_set.difference(ordered_atoms))
+    return ordered_atoms
+
+
+def get_atoms_min_fill_order(
+    phi: FNode, atoms: Iterable[FNode] | None = None
+) -> List[FNode]:
+    """Returns the atoms of phi ordered with the min-fill heuristic
+
+    Two atoms interact when they appear in the same conjunct of phi.
+    Atoms are eliminated one at a time, always picking the one whose
+    elimination adds the fewest interactions between its neighbours,
+    and the result is the reverse of the elimination order.
+    Ties are broken by the position of the atoms in the given order.
+    If all the atoms interact with each other, or if the interaction
+    graph is too dense for the heuristic to be cheap,
+    the atoms are returned in the given order
+
+    Args:
+        phi (FNode): a pysmt formula
+        atoms (Iterable[FNode] | None) [None]: the atoms of phi, in the order used to break ties.
+            If None, the atoms are taken in depth-first order
+
+    Returns:
+        List[FNode]: the atoms in the formula
+    """
+    if not isinstance(phi, FNode):
+        raise TypeError("Expected FNode found " + str(type(phi)))
+    if atoms is None:
+        atoms = get_atoms_dfs_order(phi)
+    atoms = list(atoms)
+    position = {atom: index for index, atom in enumerate(atoms)}
+    neighbours: Dict[FNode, Set[FNode]] = {atom: set() for atom in atoms}
+
+    # INTERACTION GRAPH OVER THE CONJUNCTS OF PHI
+    visited: Set[FNode] = set()
+    stack = [phi]
+    while len(stack) > 0:
+        node = stack.pop()
+        if node in visited:
+            continue
+        visited.add(node)
+        if node.is_and():
+            stack.extend(node.args())
+            continue
+        node_atoms = [atom for atom in node.get_atoms() if atom in neighbours]
+        for atom in node_atoms:
+            neighbours[atom].update(node_atoms)
+    for atom, atom_neighbours in neighbours.items():
+        atom_neighbours.discard(atom)
+    degrees_sum = sum(len(n) for n in neighbours.values())
+    if degrees_sum == len(atoms) * (len(atoms) - 1):
+        # every atom interacts with all the others, so no atom adds any fill
+        return atoms
+    work = sum(len(n) * len(n) for n in neighbours.values())
+    if work > _MIN_FILL_MAX_WORK:
+        return atoms
+
+    def _fill(atom: FNode) -> int:
+        """counts the pairs of neighbours of atom that do not interact yet"""
+        atom_neighbours = list(neighbours[atom])
+        missing = 0
+        for index, first in enumerate(atom_neighbours):
+            first_neighbours = neighbours[first]
+            for second in atom_neighbours[index + 1 :]:
+                if second not in first_neighbours:
+                    missing += 1
+        return missing
+
+    # ELIMINATION
+    # the fill of each atom is computed once, and then updated
+    # for the pairs of neighbours that change at each elimination
+    fill = {atom: _fill(atom) for atom in atoms}
+    heap = [(fill[atom], position[atom], atom) for atom in atoms]
+    heapq.heapify(heap)
+    eliminated: List[FNode] = []
+    while len(heap) > 0:
+        atom_fill, _position, atom = heapq.heappop(heap)
+        if atom not in neighbours or fill[atom] != atom_fill:
+            # already eliminated, or an outdated entry
+            continue
+        eliminated.append(atom)
+        atom_neighbours = neighbours.pop(atom)
+        changed: Set[FNode] = set()
+        # each neighbour loses the eliminated atom,
+        # together with the pairs it formed with the neighbours it did not interact with
+        for neighbour in atom_neighbours:
+            neighbour_neighbours = neighbours[neighbour]
+            neighbour_neighbours.discard(atom)
+            work += len(neighbour_neighbours)
+            lost = len(neighbour_neighbours - atom_neighbours)
+            if lost > 0:
+                fill[neighbour] -= lost
+                changed.add(neighbour)
+        # the neighbours of the eliminated atom all interact with each other
+        ordered_neighbours = list(atom_neighbours)
+        for index, first in enumerate(ordered_neighbours):
+            first_neighbours = neighbours[first]
+            for second in ordered_neighbours[index + 1 :]:
+                if second in first_neighbours:
+                    continue
+                second_neighbours = neighbours[second]
+                work += len(first_neighbours) + len(second_neighbours)
+                # the atoms next to both no longer miss this pair
+                for common in first_neighbours & second_neighbours:
+                    fill[common] -= 1
+                    changed.add(common)
+                # each of the two gains a neighbour, that does not interact
+                # with the neighbours the other does not have
+                fill[first] += len(first_neighbours - second_neighbours)
+                fill[second] += len(second_neighbours - first_neighbours)
+                changed.add(first)
+                changed.add(second)
+                first_neighbours.add(second)
+                second_neighbours.add(first)
+        if work > _MIN_FILL_MAX_WORK:
+            return atoms
+        for changed_atom in changed:
+            heapq.heappush(heap, (fill[changed_atom], position[changed_atom], changed_atom))
+    eliminated.reverse()
+    return eliminated
+
+
+def get_atoms_max_reduction_order(
+    phi: FNode, atoms: Iterable[FNode] | None = None
+) -> List[FNode]:
+    """Returns the atoms of phi ordered greedily by how much fixing them shrinks phi
+
+    At each step the atom whose positive and negative cofactors are
+    the smallest overall is picked, and the ordering goes on over
+    the bigger of the two cofactors.
+    Ties are broken by the position of the atoms in the given order.
+    If there are too many atoms or phi is too big for the heuristic
+    to be cheap, the atoms are returned in the given order
+
+    Args:
+        phi (FNode): a pysmt formula
+        atoms (Iterable[FNode] | None) [None]: the atoms of phi, in the order used to break ties.
+            If None, the atoms are taken in depth-first order
+
+    Returns:
+        List[FNode]: the atoms in the formula
+    """
+    if not isinstance(phi, FNode):
+        raise TypeError("Expected FNode found " + str(type(phi)))
+    if atoms is None:
+        atoms = get_atoms_dfs_order(phi)
+    atoms = list(atoms)
+    dag_nodes = _SizeOracle.MEASURE_DAG_NODES
+    # each step substitutes and simplifies both cofactors of every remaining atom,
+    # and each of these four walks visits the whole DAG of the current formula
+    if (
+        len(atoms) > _MAX_REDUCTION_MAX_ATOMS
+        or 4 * len(atoms) * len(atoms) * phi.size(dag_nodes) > _MAX_REDUCTION_MAX_WORK
+    ):
+        return atoms
+    true = _TRUE()
+    false = _FALSE()
+    remaining = list(atoms)
+    ordered_atoms: List[FNode] = []
+    current = phi
+    while len(remaining) > 0:
+        if current.is_constant():
+            # no atom can shrink the formula anymore
+            ordered_atoms.extend(remaining)
+            break
+        best_score = None
+        for atom in remaining:
+            positive = current.substitute({atom: true}).simplify()
+            negative = current.substitute({atom: false}).simplify()
+            positive_size = positive.size(dag_nodes)
+            negative_size = negative.size(dag_nodes)
+            score = positive_size + negative_size
+            if best_score is None or score < best_score:
+                best_score = score
+                best_atom = atom
+                best_cofactor = positive if positive_size >= negative_size else negative
+        ordered_atoms.append(best_atom)
+        remaining.remove(best_atom)
+        current = best_cofactor
+    return ordered_atoms
+
+
 def get_symbols(phi: FNode) -> List[FNode]:
     """returns all symbols in phi
 
@@ -128,6 +402,21 @@ def get_symbols(phi: FNode) -> List[FNode]:
     return list(phi.get_free_variables())
 
 
+def get_normalizer(converter) -> NormalizerWalker:
+    """Returns a walker that normalizes formulas according to the converter
+
+    The walker memoizes the normalized subformulas, so reusing it
+    for several formulas normalizes their shared subformulas only once
+
+    Args:
+        converter: the converter used to normalize the T-atoms
+
+    Returns:
+        NormalizerWalker: a new walker for the converter
+    """
+    return NormalizerWalker(converter)
+
+
 def get_normalized(phi: FNode, converter) -> FNode:
     """Returns a normalized version of phi
 
@@ -139,8 +428,31 @@ def get_normalized(phi: FNode, converter) -> FNode:
     """
     if not isinstance(phi, FNode):
         raise TypeError("Expected FNode found " + str(type(phi)))
-    walker = NormalizerWalker(converter)
-    return walker.walk(phi)
+    return get_normalizer(converter).walk(phi)
+
+
+def get_normalized_batch(
+    phis: List[FNode], converter, normalizer: NormalizerWalker | None = None
+) -> List[FNode]:
+    """Returns a normalized version of each formula in phis
+
+    All formulas are normalized by the same walker, so that
+    subformulas shared between them are normalized only once
+
+    Args:
+        phis (List[FNode]): a list of pysmt formulas
+        normalizer (NormalizerWalker | None) [None]: a walker of the converter to reuse.
+            If None, a new walker is used
+
+    Returns:
+        List[FNode]: the provided formulas normalized according to the converter
+    """
+    for phi in phis:
+        if not isinstance(phi, FNode):
+            raise TypeError("Expected FNode found " + str(type(phi)))
+    if normalizer is None:
+        normalizer = get_normalizer(converter)
+    return [normalizer.walk(phi) for phi in phis]
 
 
 def get_phi_and_lemmas(phi: FNode, tlemmas: List[FNode]) -> FNode:
@@ -175,13 +487,11 @@ def get_boolean_mapping(phi: FNode) -> Dict[FNode, FNode]:
         Dict[FNode,FNode]: a dictionary containing the mapping,
             where the fresh boolean atoms are keys and the T-atoms are items
     """
-    phi_atoms = get_atoms(phi)
-    res: Dict[FNode, FNode] = {}
-    gen = SequentialStringGenerator()
-    for atom in phi_atoms:
-        if not atom.is_symbol():
-            res.update({_Symbol(f"fresh_{gen.next_string()}", _BOOL): atom})
-    return res
+    theory_atoms = [atom for atom in get_atoms(phi) if not atom.is_symbol()]
+    names = generate_strings(len(theory_atoms))
+    return {
+        _Symbol(f"fresh_{name}", _BOOL): atom for name, atom in zip(names, theory_atoms)
+    }
 
 
 def atoms_difference(original: List[FNode], expanded: List[FNode]) -> List[FNode]:
@@ -196,11 +506,10 @@ def atoms_difference(original: List[FNode], expanded: List[FNode]) -> List[FNode
     Returns:
         List[FNode]: the atoms that appear in expanded, but do not appear in original
     """
-    result: Set[FNode] = set()
-    for atom in expanded:
-        if not atom in original:
-            result.add(atom)
-    return list(result)
+    # original is a list, so membership is tested on a set built from it.
+    # The result keeps the order of expanded, so that it does not depend on hashing
+    original_set: Set[FNode] = set(original)
+    return list(dict.fromkeys(atom for atom in expanded if atom not in original_set))
 
 
 def big_and(nodes: List[FNode]) -> FNode:
@@ -230,19 +539,10 @@ def save_refinement(mapping: Dict[object, FNode], mapping_file: str) -> None:
     """
 
     # collect serialized mapping items
-    mapping_items: List[Tuple[object, str]] = []
-    for k, v in mapping.items():
-        # serialize formula into SMTlib script and read it on a string stream
-        script = _script_from_formula(v)
-        output_stream = StringIO()
-        script.serialize(output_stream)
-        serialized_item = output_stream.getvalue()
-        # add serialized item to list
-        mapping_items.append((k, serialized_item))
-
-    # write mapping_items in mapping file
-    with open(mapping_file, "w", encoding="utf8") as out:
-        json.dump(mapping_items, out)
+    mapping_items: List[Tuple[object, str]] = [
+        (k, serialize_phi(v)) for k, v in mapping.items()
+    ]
+    _save_mapping_items(mapping_items, mapping_file)
 
 
 def save_abstraction_function(mapping: Dict[FNode, object], mapping_file: str) -> None:
@@ -255,19 +555,54 @@ def save_abstraction_function(mapping: Dict[FNode, object], mapping_file: str) -
         mapping_file (str) -> the path to the file where the mapping file will be saved
     """
     # collect serialized mapping items
-    mapping_items: List[Tuple[str, object]] = []
-    for k, v in mapping.items():
-        # serialize formula into SMTlib script and read it on a string stream
-        script = _script_from_formula(k)
-        output_stream = StringIO()
-        script.serialize(output_stream)
-        serialized_item = output_stream.getvalue()
-        # add serialized item to list
-        mapping_items.append((serialized_item, v))
+    mapping_items: List[Tuple[str, object]] = [
+        (serialize_phi(k), v) for k, v in mapping.items()
+    ]
+    _save_mapping_items(mapping_items, mapping_file)
+
+
+def json_dumps(obj: object) -> bytes:
+    """serializes an object to JSON encoded in UTF-8,
+    with orjson if it is installed
+
+    Args:
+        obj (object): the object to be serialized
+
+    Returns:
+        bytes: the JSON serialization of the object
+    """
+    if _orjson is not None:
+        return _orjson.dumps(obj)
+    return json.dumps(obj).encode("utf8")
+
+
+def json_loads(data: bytes) -> object:
+    """deserializes an object from JSON data,
+    with orjson if it is installed
+
+    Args:
+        data (bytes): the JSON serialization of the object
+
+    Returns:
+        object: the deserialized object
+    """
+    if _orjson is not None:
+        return _orjson.loads(data)
+    return json.loads(data)
+
+
+def _save_mapping_items(mapping_items: List[Tuple], mapping_file: str) -> None:
+    """writes the serialized items of a mapping in a JSON file with a single write"""
+    data = json_dumps(mapping_items)
+    with open(mapping_file, "wb") as out:
+        out.write(data)
+
 
-    # write mapping_items in mapping file
-    with open(mapping_file, "w", encoding="utf8") as out:
-        json.dump(mapping_items, out)
+def _load_mapping_items(mapping_path: str) -> List[Tuple]:
+    """reads the serialized items of a mapping from a JSON file"""
+    with open(mapping_path, "rb") as input_data:
+        data = input_data.read()
+    return json_loads(data)
 
 
 def load_refinement(mapping_path: str) -> Dict[object, FNode]:
@@ -287,14 +622,15 @@ def load_refinement(mapping_path: str) -> Dict[object, FNode]:
         )
 
     mapping: Dict[object, FNode] = {}
-    with open(mapping_path, "r", encoding="utf8") as input_data:
-        mapping_items: List[Tuple[int, str]] = json.load(input_data)
-        for item in mapping_items:
-            key = item[0]
-            serialized_formula = item[1]
-            # read serialized formula from string stream
-            input_stream = StringIO(serialized_formula)
-            mapping[key] = _get_formula(input_stream)
+    # a single parser is shared by all the items
+    parser = _SmtLibParser()
+    mapping_items: List[Tuple[int, str]] = _load_mapping_items(mapping_path)
+    for item in mapping_items:
+        key = item[0]
+        serialized_formula = item[1]
+        # read serialized formula from string stream
+        input_stream = StringIO(serialized_formula)
+        mapping[key] = parser.get_script(input_stream).get_last_formula()
     return mapping
 
 
@@ -315,14 +651,15 @@ def load_abstraction_function(mapping_path: str) -> Dict[FNode, object]:
         )
 
     mapping: Dict[FNode, object] = {}
-    with open(mapping_path, "r", encoding="utf8") as input_data:
-        mapping_items: List[Tuple[int, str]] = json.load(input_data)
-        for item in mapping_items:
-            key = item[1]
-            serialized_formula = item[0]
-            # read serialized formula from string stream
-            input_stream = StringIO(serialized_formula)
-            mapping[_get_formula(input_stream)] = key
+    # a single parser is shared by all the items
+    parser = _SmtLibParser()
+    mapping_items: List[Tuple[int, str]] = _load_mapping_items(mapping_path)
+    for item in mapping_items:
+        key = item[1]
+        serialized_formula = item[0]
+        # read serialized formula from string stream
+        input_stream = StringIO(serialized_formula)
+        mapping[parser.get_script(input_stream).get_last_formula()] = key
     return mapping
 
 
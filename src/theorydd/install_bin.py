@@ -160,16 +160,14 @@ def clone_repo(repo_url: str, repo_path: str) -> None:
 
 def create_binary_folder(binary_path: str) -> None:
     """Creates the binary folder if it doesn't exist"""
-    if not os.path.exists(binary_path):
-        os.mkdir(binary_path)
+    os.makedirs(binary_path, exist_ok=True)
 
 def run_setup():
     """Run setup"""
     args = get_args()
     module_path = os.path.dirname(os.path.realpath(__file__))
     binary_path = module_path + "/bin"
-    if not os.path.exists(binary_path):
-        os.mkdir(binary_path)
+    os.makedirs(binary_path, exist_ok=True)
     if args.c2d:
         print("Installing the c2d compiler...")
         try:
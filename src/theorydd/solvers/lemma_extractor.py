@@ -45,7 +45,7 @@ def extract(
     else:
         smt_result = smt_solver.check_all_sat(phi, boolean_mapping)
     elapsed_time = time.time() - start_time
-    logger.info("Computed AllSMT in %s seconds", str(elapsed_time))
+    logger.info("Computed AllSMT in %s seconds", elapsed_time)
     computation_logger["All-SMT computation time"] = elapsed_time
     lemmas = smt_solver.get_theory_lemmas()
     computation_logger["T-lemmas amount"] = len(lemmas)
@@ -59,7 +59,10 @@ def extract(
 
 
 def find_qvars(
-    original_phi: FNode, phi_and_lemmas: FNode, computation_logger: Dict = None
+    original_phi: FNode,
+    phi_and_lemmas: FNode,
+    computation_logger: Dict = None,
+    atoms: List[FNode] | None = None,
 ):
     """Finds the atoms on which to existentially quantify when building a T-DD (the fresh T-atoms from T-lemmas)
 
@@ -67,6 +70,8 @@ def find_qvars(
         original_phi (FNode): a pysmt formulas without integrated lemmas
         phi_and_lemmas (FNode): the same pysmt formula as phi, but with integrated lemmas
         computation_logger (Dict) [None]: a dictionary that will be updated to store computation info
+        atoms (List[FNode] | None) [None]: the atoms of phi_and_lemmas, if they are already known.
+            If this is None, they are collected from phi_and_lemmas
 
     Returns:
         bool: True if the solver is valid, False otherwise
@@ -77,12 +82,15 @@ def find_qvars(
     start_time = time.time()
     logger.info("Finding fresh atoms from all-sat computation...")
     phi_atoms = formula.get_atoms(original_phi)
-    phi_lemma_atoms = formula.get_atoms(phi_and_lemmas)
+    if atoms is not None:
+        phi_lemma_atoms = atoms
+    else:
+        phi_lemma_atoms = formula.get_atoms(phi_and_lemmas)
     new_theory_atoms = []
     if len(phi_atoms) < len(phi_lemma_atoms):
         new_theory_atoms = formula.atoms_difference(phi_atoms, phi_lemma_atoms)
     computation_logger["fresh T-atoms detected"] = len(new_theory_atoms)
     elapsed_time = time.time() - start_time
-    logger.info("Fresh atoms found in %s seconds", str(elapsed_time))
+    logger.info("Fresh atoms found in %s seconds", elapsed_time)
     computation_logger["fresh T-atoms detection time"] = elapsed_time
     return new_theory_atoms
@@ -104,6 +104,17 @@ class MathSATTotalEnumerator(SMTEnumerator):
         """Returns the models found during the All-SAT computation"""
         return self._models
 
+    def are_lemmas_normalized(self) -> bool:
+        """Returns True, since the theory lemmas are converted back from MathSAT"""
+        return True
+
+    def get_atoms(self) -> List[FNode]:
+        """Returns the atoms of the last formula checked and of its theory lemmas"""
+        atoms = set(self._atoms)
+        for lemma in self._tlemmas:
+            atoms.update(lemma.get_atoms())
+        return list(atoms)
+
     def get_converter(self):
         """Returns the converter used for the normalization of T-atoms"""
         return self._converter
@@ -1,11 +1,16 @@
 """interface that all solvers must implement."""
 
 from abc import ABC, abstractmethod
-from typing import Dict, Iterable
+from typing import Dict, Iterable, List
 
 from pysmt.fnode import FNode
 from theorydd.constants import SAT, UNSAT
-from theorydd.formula import get_normalized, get_atom_partitioning, get_true_given_atoms
+from theorydd.formula import (
+    get_atom_partitioning,
+    get_true_given_atoms,
+    get_normalizer as _get_normalizer,
+)
+from theorydd.walkers.normalizer import NormalizerWalker
 
 
 class SMTEnumerator(ABC):
@@ -14,6 +19,8 @@ class SMTEnumerator(ABC):
     This interface must be implemented by all the solvers that are used to compute all-SMT.
     """
 
+    _normalizer: NormalizerWalker | None = None
+
     def __init__(self):
         pass
 
@@ -37,6 +44,25 @@ class SMTEnumerator(ABC):
         """return the list of models"""
         pass
 
+    def get_normalizer(self) -> NormalizerWalker:
+        """return a walker that normalizes formulas according to the converter
+
+        The converter is fetched and the walker is created once per solver,
+        so that its memoization is shared by all the formulas it normalizes"""
+        if self._normalizer is None:
+            self._normalizer = _get_normalizer(self.get_converter())
+        return self._normalizer
+
+    def are_lemmas_normalized(self) -> bool:
+        """return True if the theory lemmas are already normalized
+        according to the converter, so they need not be normalized again"""
+        return False
+
+    def get_atoms(self) -> List[FNode] | None:
+        """return the atoms of the last formula checked and of its theory lemmas,
+        or None if the solver does not keep track of them"""
+        return None
+
     def enumerate_true(self, phi: FNode, stop_at_unsat: bool = False) -> bool:
         """enumerate all lemmas on the formula phi
 
@@ -48,7 +74,7 @@ class SMTEnumerator(ABC):
             bool: SAT or UNSAT, depending on satisfiability of phi
         """
         # normalize phi
-        phi = get_normalized(phi, self.get_converter())
+        phi = self.get_normalizer().walk(phi)
 
         # compute partitioning over the atoms of phi
         partitions = get_atom_partitioning(phi)
@@ -1,7 +1,6 @@
 """this module handles interactions with the mathsat solver"""
 
 import os
-import re
 import subprocess
 
 import sys
@@ -13,13 +12,16 @@ from theorydd.constants import (
     SAT,
     UNSAT,
     TABULAR_ALLSMT_COMMAND as _TABULAR_ALLSMT_COMMAND,
-    TLEMMAS_FILE_REGEX as _TLEMMAS_FILE_REGEX,
+    RE_TLEMMAS_FILE as _RE_TLEMMAS_FILE,
+    TABULAR_MODEL_COUNT_LABEL as _TABULAR_MODEL_COUNT_LABEL,
+    TABULAR_PARTIAL_COUNT_LABEL as _TABULAR_PARTIAL_COUNT_LABEL,
+    RE_TABULAR_MODEL_COUNT as _RE_TABULAR_MODEL_COUNT,
 )
 
 # only used for normalization
 from theorydd.solvers.mathsat_total import MathSATTotalEnumerator as _Enumerator
 from theorydd.solvers.solver import SMTEnumerator
-from theorydd.formula import get_normalized, save_phi, read_phi
+from theorydd.formula import save_phi, read_phi
 
 
 class TabularSMTSolver(SMTEnumerator):
@@ -46,6 +48,23 @@ class TabularSMTSolver(SMTEnumerator):
         self._converter = self.normalizer_solver.get_converter()
         self._atoms = []
         self._is_partial = is_partial
+        if self._is_partial:
+            minimize_models = "true"
+        else:
+            minimize_models = "false"
+        # run solver with one hour timeout
+        self._command = [
+            "timeout",
+            "3600",
+            _TABULAR_ALLSMT_COMMAND,
+            "--debug.dump_theory_lemmas=true",
+            "--dpll.store_tlemmas=true",
+            "--theory.la.split_rat_eq=false",
+            "--preprocessor.simplification=0",
+            "--preprocessor.toplevel_propagation=false",
+            f"--dpll.allsat_minimize_model={minimize_models}",
+            "--noprint",
+        ]
 
     def check_all_sat(
         self, phi: FNode, boolean_mapping: Dict[FNode, FNode] | None = None
@@ -65,9 +84,11 @@ class TabularSMTSolver(SMTEnumerator):
         self._models = []
         self._atoms = []
 
-        self._atoms = phi.get_atoms()
-
-        normal_phi = get_normalized(phi, self.get_converter())
+        # a single walker is reused so that its memoization is shared
+        # between phi and all the T-lemmas read from the solver output
+        normalizer = self.get_normalizer()
+        normal_phi = normalizer.walk(phi)
+        self._atoms = normal_phi.get_atoms()
 
         # cannot use CNF-ization because it changes the important atoms of the formula
         # phi_tsetsin = PolarityCNFizer(nnf=True, mutex_nnf_labels=True).convert_as_formula(normal_phi)
@@ -77,17 +98,9 @@ class TabularSMTSolver(SMTEnumerator):
         # save_phi(phi_tsetsin, phi_file)
         save_phi(normal_phi, phi_file)
 
-        if self._is_partial:
-            minimize_models = "true"
-        else:
-            minimize_models = "false"
-
-        # run solver with one hour timeout
-        options = f"--debug.dump_theory_lemmas=true --dpll.store_tlemmas=true --theory.la.split_rat_eq=false --preprocessor.simplification=0 --preprocessor.toplevel_propagation=false --dpll.allsat_minimize_model={minimize_models} --noprint"
-
-        command = f"timeout 3600 {_TABULAR_ALLSMT_COMMAND} {options} < {phi_file}"
         try:
-            output_data = subprocess.check_output(command, shell=True, text=True)
+            with open(phi_file, "rb") as phi_input:
+                output_data = subprocess.check_output(self._command, stdin=phi_input)
         except subprocess.CalledProcessError as e:
             result = e.returncode
             _clear_tlemmas()
@@ -101,11 +114,10 @@ class TabularSMTSolver(SMTEnumerator):
                 print("Error")
                 sys.exit(result)
 
-        for item in os.listdir():
-            if re.search(_TLEMMAS_FILE_REGEX, item):
-                tlemma = read_phi(item)
-                normal_tlemma = get_normalized(tlemma, self.get_converter())
-                self._tlemmas.append(normal_tlemma)
+        for item in _tlemmas_files():
+            tlemma = read_phi(item)
+            normal_tlemma = normalizer.walk(tlemma)
+            self._tlemmas.append(normal_tlemma)
 
         # remove temporary files
         # lemmas
@@ -116,18 +128,19 @@ class TabularSMTSolver(SMTEnumerator):
         # read model
         # output syntax:
         # [MODELS] s MODEL COUNT <models>
-        try:
-            if not self._is_partial:
-                total_models_tokenized = output_data.split("MODEL COUNT")
-            else:
-                total_models_tokenized = output_data.split(
-                    "NUMBER OF PARTIAL ASSIGNMENTS"
-                )
-            if len(total_models_tokenized) != 2:
-                raise ValueError
-            total_models_string = total_models_tokenized[1].strip()
-            total_models = int(total_models_string)
-        except ValueError:
+        # the count is at the tail of the output, so search backwards for
+        # its label instead of splitting the whole output
+        if not self._is_partial:
+            count_label = _TABULAR_MODEL_COUNT_LABEL
+        else:
+            count_label = _TABULAR_PARTIAL_COUNT_LABEL
+        label_position = output_data.rfind(count_label)
+        found = None
+        if label_position >= 0:
+            found = _RE_TABULAR_MODEL_COUNT.match(output_data, label_position)
+        if found is not None:
+            total_models = int(found.group(1))
+        else:
             total_models = 0
 
         # placeholder in order to ignore models but return a count
@@ -148,6 +161,17 @@ class TabularSMTSolver(SMTEnumerator):
         """Returns the models found during the All-SAT computation"""
         return self._models
 
+    def are_lemmas_normalized(self) -> bool:
+        """Returns True, since the theory lemmas are normalized as they are read"""
+        return True
+
+    def get_atoms(self) -> List[FNode]:
+        """Returns the atoms of the last formula checked and of its theory lemmas"""
+        atoms = set(self._atoms)
+        for lemma in self._tlemmas:
+            atoms.update(lemma.get_atoms())
+        return list(atoms)
+
     def get_converter(self):
         """Returns the converter used for the normalization of T-atoms"""
         return self._converter
@@ -171,10 +195,19 @@ class TabularPartialSMTSolver(TabularSMTSolver):
     def __init__(self) -> None:
         super().__init__(is_partial=True)
 
+def _tlemmas_files() -> List[str]:
+    """returns the paths of the T-lemma files dumped in the working directory"""
+    with os.scandir() as entries:
+        return [
+            entry.path
+            for entry in entries
+            if _RE_TLEMMAS_FILE.fullmatch(entry.name) and entry.is_file()
+        ]
+
+
 def _clear_tlemmas():
-    for item in os.listdir():
-        if re.search(_TLEMMAS_FILE_REGEX, item):
-            os.remove(item)
+    for item in _tlemmas_files():
+        os.remove(item)
 
 
 if __name__ == "__main__":
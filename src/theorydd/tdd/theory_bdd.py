@@ -1,23 +1,29 @@
 """theory BDD module"""
 
-import json
-import time
+import functools
+import operator
 import os
+import tempfile
 import logging
-from typing import Dict, Generator, List
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, FrozenSet, Generator, List, Tuple
 from pysmt.fnode import FNode
-import pydot
 from dd import cudd as cudd_bdd
 from theorydd import formula
-from theorydd.util._dd_dump_util import change_bbd_dot_names as _change_bbd_dot_names
-from theorydd.util._string_generator import SequentialStringGenerator
+from theorydd.util._dd_dump_util import (
+    change_bbd_dot_names as _change_bbd_dot_names,
+    dot_file_to_svg as _dot_file_to_svg,
+    dot_lines_to_svg as _dot_lines_to_svg,
+    rename_bdd_dot_lines as _rename_bdd_dot_lines,
+    temporary_dot_file as _temporary_dot_file,
+)
+from theorydd.util._string_generator import generate_strings
 from theorydd.util._utils import (
     cudd_dump as _cudd_dump,
     cudd_load as _cudd_load,
     get_solver as _get_solver,
 )
 from theorydd.solvers.solver import SMTEnumerator
-from theorydd.formula import get_atoms
 from theorydd.util.custom_exceptions import QueryError
 from theorydd.walkers.walker_bdd import BDDWalker
 from theorydd.solvers.lemma_extractor import find_qvars
@@ -37,7 +43,13 @@ class TheoryBDD(TheoryDD):
     qvars: List[FNode]
     abstraction: Dict[FNode, str]
     refinement: Dict[str, FNode]
-    logger: logging.Logger
+    logger: logging.Logger = logging.getLogger("theorydd_bdd")
+    _qvar_labels: FrozenSet[str] | None
+    _care_vars: FrozenSet[str] | None
+    _true: cudd_bdd.Function
+    _false: cudd_bdd.Function
+    _condition_cache: Dict[str, cudd_bdd.Function]
+    _cached_models: int | None
 
     def __init__(
         self,
@@ -48,6 +60,8 @@ class TheoryBDD(TheoryDD):
         sat_result: bool | None = None,
         computation_logger: Dict = None,
         folder_name: str | None = None,
+        dynamic_reorder: bool = True,
+        max_reduction_order: bool = False,
     ) -> None:
         """Builds a T-BDD. The construction requires the
         computation of All-SMT for the provided formula to
@@ -66,16 +80,24 @@ class TheoryBDD(TheoryDD):
             computation_logger (Dict) [None]: a dictionary that will be updated to store computation info.
             folder_name (str | None) [None]: the path to a folder where data to load the T-BDD is stored.
                 If this is not None, then all other parameters are ignored
+            dynamic_reorder (bool) [True]: if True, CUDD dynamically reorders the variables
+                with group sifting while the T-BDD is built. The initial order is only used as a hint
+            max_reduction_order (bool) [False]: if True, the variable order is refined with the
+                max-reduction heuristic, which is only applied to small formulas and can be slow
         """
         super().__init__()
-        self.logger = logging.getLogger("theorydd_bdd")
+        self._condition_cache = {}
+        # model count of the current root, cleared whenever the root changes.
+        # The node count is not cached, since dynamic reordering
+        # can change it even when the root does not change
+        self._cached_models = None
         if folder_name is not None:
             self._load_from_folder(folder_name)
             return
         if computation_logger is None:
             computation_logger = {}
         if computation_logger.get("T-BDD") is None:
-            computation_logger["T-BDD"] = {}
+            computation_logger["T-BDD"] = self._new_computation_log()
 
         # NORMALIZE PHI
         if isinstance(solver, str):
@@ -97,41 +119,60 @@ class TheoryBDD(TheoryDD):
         # COMPUTE PHI AND LEMMAS
         phi_and_lemmas = formula.get_phi_and_lemmas(phi, tlemmas)
 
+        # the atoms of phi and lemmas are collected once,
+        # both the fresh T-atoms and the mapping are computed from them
+        atoms = self._get_atoms(
+            phi_and_lemmas, smt_solver, computation_logger["T-BDD"]
+        )
+
         # FIND QVARS
         self.qvars = find_qvars(
             phi,
             phi_and_lemmas,
             computation_logger=computation_logger["T-BDD"],
+            atoms=atoms,
         )
 
-        atoms = get_atoms(phi_and_lemmas)
+        # the labels and the BDD levels follow the order of the atoms.
+        # The T-DD of an UNSAT formula is false whatever the order,
+        # so its atoms are not ordered
+        if sat_result is None or sat_result == SAT:
+            atoms = self._order_atoms(
+                phi_and_lemmas, atoms, computation_logger["T-BDD"], max_reduction_order
+            )
 
         # CREATING VARIABLE MAPPING
         self.abstraction = self._compute_mapping(atoms, computation_logger["T-BDD"])
-        self.refinement = {v: k for k, v in self.abstraction.items()}
 
         # PREPARE FOR BUILDING
-        start_time = time.time()
         self.logger.info("starting T-BDD preparation phase...")
-        self.bdd = cudd_bdd.BDD()
-        appended_values = set()
-        all_values = [self.abstraction[atom] for atom in self.qvars]
-        for atom in self.qvars:
-            appended_values.add(self.abstraction[atom])
-        for value in self.abstraction.values():
-            if not value in appended_values:
-                all_values.append(value)
-        self.bdd.declare(*all_values)
-        bdd_ordering = {}
-        for i, item in enumerate(all_values):
-            bdd_ordering[item] = i
-        cudd_bdd.reorder(self.bdd, bdd_ordering)
-        walker = BDDWalker(self.abstraction, self.bdd)
-        elapsed_time = time.time() - start_time
-        self.logger.info(
-            "BDD preparation phase completed in %s seconds", str(elapsed_time)
-        )
-        computation_logger["T-BDD"]["DD preparation time"] = elapsed_time
+        with self._timed(
+            computation_logger["T-BDD"], "DD preparation time", "BDD preparation phase completed"
+        ):
+            self.bdd = cudd_bdd.BDD()
+            self._true = self.bdd.true
+            self._false = self.bdd.false
+            if len(self.qvars) == 0:
+                # the mapping order is already the variable order
+                all_values = self.abstraction.values()
+            else:
+                # qvars are declared last, at the bottom of the order,
+                # where and_exists quantifies them closest to the leaves
+                qvar_values = [self.abstraction[atom] for atom in self.qvars]
+                # the labels of the qvars are known here, no need to map them again
+                self._qvar_labels = frozenset(qvar_values)
+                all_values = [
+                    value
+                    for value in self.abstraction.values()
+                    if value not in self._qvar_labels
+                ]
+                all_values.extend(qvar_values)
+            # variables are placed at the levels in which they are declared,
+            # so there is no need to reorder the empty manager
+            self.bdd.declare(*all_values)
+            # CUDD reorders dynamically with group sifting
+            self.bdd.configure(reordering=dynamic_reorder, max_growth=1.2)
+            walker = BDDWalker(self.abstraction, self.bdd)
 
         if sat_result is None or sat_result == SAT:
             self.root = self._build(phi, tlemmas, walker, computation_logger["T-BDD"])
@@ -141,23 +182,26 @@ class TheoryBDD(TheoryDD):
     def _compute_mapping(
         self, atoms: List[FNode], computation_logger: dict
     ) -> Dict[FNode, str]:
-        """computes the mapping"""
-        start_time = time.time()
+        """computes the mapping
+
+        The refinement is built from the same labels and stored in self.refinement"""
         self.logger.info("Creating mapping...")
-        mapping = {}
-
-        string_generator = SequentialStringGenerator()
-        for atom in atoms:
-            mapping[atom] = string_generator.next_string()
-        elapsed_time = time.time() - start_time
-        self.logger.info("Mapping created in %s seconds", str(elapsed_time))
-        computation_logger["variable mapping creation time"] = elapsed_time
+        with self._timed(computation_logger, "variable mapping creation time", "Mapping created"):
+            labels = generate_strings(len(atoms))
+            mapping = dict(zip(atoms, labels))
+            self.refinement = dict(zip(labels, atoms))
         return mapping
 
     def _enumerate_qvars(
         self, tlemmas_dd: object, mapped_qvars: List[object]
     ) -> object:
-        return cudd_bdd.and_exists(tlemmas_dd, self.bdd.true, mapped_qvars)
+        return cudd_bdd.and_exists(tlemmas_dd, self._true, mapped_qvars)
+
+    def _join_enumerating_qvars(
+        self, phi_dd: object, tlemmas_dd: object, mapped_qvars: List[object]
+    ) -> object:
+        # CUDD computes the conjunction and the quantification in a single pass
+        return cudd_bdd.and_exists(phi_dd, tlemmas_dd, mapped_qvars)
 
     def __len__(self) -> int:
         """returns the number of nodes in the T-BDD"""
@@ -173,14 +217,21 @@ class TheoryBDD(TheoryDD):
 
     def count_models(self) -> int:
         """returns the amount of models in the T-BDD"""
-        try:
-            total = self.root.count(
-                nvars=len(self.abstraction.keys()) - len(self.qvars)
-            )
-        except RuntimeError:
-            # sometimes CUDD throws a RuntimeError when counting models
-            # when it runs out of memory
-            total = -1
+        if self._cached_models is not None:
+            return self._cached_models
+        # constant roots are counted without traversing the BDD
+        if self.root == self._false:
+            total = 0
+        elif self.root == self._true:
+            total = 2 ** len(self._get_care_vars())
+        else:
+            try:
+                total = self.root.count(nvars=len(self._get_care_vars()))
+            except RuntimeError:
+                # sometimes CUDD throws a RuntimeError when counting models
+                # when it runs out of memory, a failed count is not cached
+                return -1
+        self._cached_models = total
         return total
 
     def graphic_dump(
@@ -196,20 +247,22 @@ class TheoryBDD(TheoryDD):
                 with the names of the abstraction of the atoms instead of the
                 full names of atoms
         """
-        temporary_dot = "bdd_temporary_dot.dot"
-        reverse_mapping = self.refinement
         if output_file.endswith(".dot"):
             self.bdd.dump(output_file, filetype="dot", roots=[self.root])
             if not dump_abstraction:
-                _change_bbd_dot_names(output_file, reverse_mapping)
+                _change_bbd_dot_names(output_file, self.refinement)
         elif output_file.endswith(".svg"):
-            self.bdd.dump(temporary_dot, filetype="dot", roots=[self.root])
-            if not dump_abstraction:
-                _change_bbd_dot_names(temporary_dot, reverse_mapping)
-            with open(temporary_dot, "r", encoding="utf8") as dot_content:
-                (graph,) = pydot.graph_from_dot_data(dot_content.read())
-                graph.write_svg(output_file)
-            os.remove(temporary_dot)
+            with _temporary_dot_file() as temporary_dot:
+                self.bdd.dump(temporary_dot.name, filetype="dot", roots=[self.root])
+                if dump_abstraction:
+                    _dot_file_to_svg(temporary_dot.name, output_file)
+                else:
+                    # names are replaced while streaming the dot file to Graphviz
+                    with open(temporary_dot.name, "r", encoding="utf8") as dot_lines:
+                        _dot_lines_to_svg(
+                            _rename_bdd_dot_lines(dot_lines, self.refinement),
+                            output_file,
+                        )
         else:
             self.logger.info("Unable to dump T-BDD file: format not unsupported")
             return
@@ -221,13 +274,7 @@ class TheoryBDD(TheoryDD):
 
     def is_sat(self) -> bool:
         """Returns True if the encoded formula is satisfiable"""
-        return self.root != self.bdd.false
-
-    def _get_care_vars(self) -> List[str]:
-        dont_care_vars = set([self.abstraction[qvar] for qvar in self.qvars])
-        all_vars = set(self.abstraction.values())
-        care_vars = all_vars.difference(dont_care_vars)
-        return care_vars
+        return self.root != self._false
 
     def is_valid(self) -> bool:
         """Returns True if the encoded formula is valid
@@ -235,7 +282,7 @@ class TheoryBDD(TheoryDD):
         Raises:
             QueryError: if the model counting fails
         """
-        return self.root == self.bdd.true
+        return self.root == self._true
 
     def pick(self) -> Dict[FNode, bool] | None:
         """Returns a partial model of the encoded formula,
@@ -245,16 +292,37 @@ class TheoryBDD(TheoryDD):
         return self._convert_assignment(self.root.pick())
 
     def _convert_assignment(self, assignment):
-        return {self.refinement[var]: truth for var, truth in assignment.items()}
+        refinement = self.refinement
+        return {refinement[var]: truth for var, truth in assignment.items()}
 
     def pick_all(self) -> List[Dict[FNode, bool]]:
         """Returns all partial models of the encoded formula"""
-        if not self.is_sat():
-            return []
-        care_vars = self._get_care_vars()
-        items = list(self.bdd.pick_iter(self.root, care_vars))
-        return [self._convert_assignment(i) for i in items]
+        return list(self.pick_all_iter())
     
+    def pick_all_array(self) -> Tuple[List[FNode], bytearray]:
+        """Returns all partial models of the encoded formula packed in a byte array
+
+        Each model takes one byte for each of the returned atoms, in the same order:
+        0 means False, 1 means True and 2 means that the atom is not assigned
+
+        Returns:
+            List[FNode]: the atoms the models assign
+            bytearray: the models, one after the other
+        """
+        care_vars = list(self._get_care_vars())
+        atoms = [self.refinement[var] for var in care_vars]
+        models = bytearray()
+        if not self.is_sat():
+            return atoms, models
+        positions = {var: i for i, var in enumerate(care_vars)}
+        unassigned_model = bytes([2]) * len(care_vars)
+        for item in self.bdd.pick_iter(self.root, care_vars):
+            model = bytearray(unassigned_model)
+            for var, truth in item.items():
+                model[positions[var]] = truth
+            models += model
+        return atoms, models
+
     def pick_all_iter(self) -> Generator[Dict[FNode, bool], None, None]:
         """Returns all partial models of the encoded formula"""
         if not self.is_sat():
@@ -263,20 +331,49 @@ class TheoryBDD(TheoryDD):
         for item in self.bdd.pick_iter(self.root, care_vars):
             yield self._convert_assignment(item)
 
-    def condition(self, condition: str) -> None:
+    def condition(self, condition: str | List[str]) -> None:
         """Condition the T-BDD over a given atom
 
         Args:
-            condition (str): the label of atom over which to condition
+            condition (str | List[str]): the label of atom over which to condition,
+                or a list of labels to condition over all of them at once
         """
-        negated = False
-        if condition.startswith("-"):
-            negated = True
-            condition = condition[1:]
-        condition_bdd = self.bdd.add_expr(condition)
-        if negated:
-            condition_bdd = ~condition_bdd
-        self.root = self.root & condition_bdd
+        if isinstance(condition, str):
+            condition = [condition]
+        if len(condition) == 0:
+            return
+        self._cached_models = None
+        if len(condition) == 1:
+            self.root = self.root & self._get_condition_bdd(condition[0])
+            return
+        # labels of single atoms are collected in a cube,
+        # which CUDD builds directly without any parsing
+        literals = {}
+        condition_bdds = []
+        for label in condition:
+            negated = label.startswith("-")
+            var = label[1:] if negated else label
+            if var not in self.refinement:
+                condition_bdds.append(self._get_condition_bdd(label))
+            elif literals.setdefault(var, not negated) == negated:
+                # both the atom and its negation are required
+                self.root = self._false
+                return
+        condition_bdds.append(self.bdd.cube(literals))
+        self.root = self.root & functools.reduce(operator.and_, condition_bdds)
+
+    def _get_condition_bdd(self, condition: str) -> cudd_bdd.Function:
+        """returns the BDD of a condition, parsing it only the first time it is seen"""
+        condition_bdd = self._condition_cache.get(condition)
+        if condition_bdd is None:
+            if condition.startswith("-"):
+                condition_bdd = ~self._get_condition_bdd(condition[1:])
+            elif condition in self.refinement:
+                condition_bdd = self.bdd.var(condition)
+            else:
+                condition_bdd = self.bdd.add_expr(condition)
+            self._condition_cache[condition] = condition_bdd
+        return condition_bdd
 
     def save_to_folder(self, folder_path: str) -> None:
         """Save all the T-BDD data inside files in the specified folder
@@ -284,17 +381,14 @@ class TheoryBDD(TheoryDD):
         Args:
             file_path (str): the path to the output file
         """
-        # CHECK IF FOLDER EXISTS AND CREATE IT IF NOT
-        if not os.path.exists(folder_path):
-            os.makedirs(folder_path)
+        # CREATE FOLDER IF IT DOES NOT EXIST
+        os.makedirs(folder_path, exist_ok=True)
         # SAVE MAPPING
         formula.save_abstraction_function(
             self.abstraction, f"{folder_path}/abstraction.json"
         )
         # SAVE QVARS
-        qvars_indexes = [self.abstraction[qvar] for qvar in self.qvars]
-        with open(f"{folder_path}/qvars.qvars", "w", encoding="utf8") as out:
-            json.dump(qvars_indexes, out)
+        self._save_qvars(folder_path)
         # SAVE DD
         _cudd_dump(self.root, f"{folder_path}/tbdd_data")
 
@@ -304,21 +398,111 @@ class TheoryBDD(TheoryDD):
         Args:
             folder_path (str): the path to the folder where the data is stored
         """
-        if not os.path.exists(folder_path):
-            raise FileNotFoundError(
-                f"Folder {folder_path} does not exist, cannot load T-BDD"
-            )
-        self.abstraction = formula.load_abstraction_function(
-            f"{folder_path}/abstraction.json"
+        paths = self._scan_folder(
+            folder_path,
+            ["abstraction.json", "qvars.qvars", "tbdd_data.pickle", "tbdd_data.dddmp"],
         )
+        self.abstraction = formula.load_abstraction_function(paths["abstraction.json"])
         self.refinement = {v: k for k, v in self.abstraction.items()}
         self.bdd = cudd_bdd.BDD()
+        self._true = self.bdd.true
+        self._false = self.bdd.false
         self.bdd.declare(*self.abstraction.values())
         self.root = _cudd_load(f"{folder_path}/tbdd_data", self.bdd)
         # load qvars
-        with open(f"{folder_path}/qvars.qvars", "r", encoding="utf8") as input_data:
-            qvars_indexes = json.load(input_data)
-            self.qvars = [self.refinement[qvar_id] for qvar_id in qvars_indexes]
+        self._load_qvars(folder_path)
+
+
+def _build_and_save_tbdd(
+    serialized_phi: str, solver: str, folder_path: str, **kwargs
+) -> Dict:
+    """builds the T-BDD of a serialized formula and saves it in folder_path,
+    passing kwargs to the TheoryBDD constructor
+
+    Returns the computation logger of the construction"""
+    phi = formula.deserialize_phi(serialized_phi)
+    computation_logger = {}
+    tbdd = TheoryBDD(
+        phi, solver=solver, computation_logger=computation_logger, **kwargs
+    )
+    tbdd.save_to_folder(folder_path)
+    return computation_logger
+
+
+def build_tbdds_parallel(
+    phis: List[FNode],
+    folder_paths: List[str],
+    solver: str = "total",
+    n_workers: int | None = None,
+    **kwargs,
+) -> List[Dict]:
+    """Builds the T-BDDs of independent formulas in parallel
+
+    Each T-BDD is built in a separate process, with its own solver
+    and BDD manager, and saved in the corresponding folder.
+    The T-BDDs can then be loaded with tbdd_load_from_folder
+
+    Args:
+        phis (List[FNode]): the pysmt formulas to compile
+        folder_paths (List[str]): the folder where each T-BDD is saved
+        solver (str) ["total"]: the name of the solver to use for All-SMT computation.
+            Solver instances cannot be shared between processes
+        n_workers (int | None) [None]: the number of worker processes.
+            If None, the number of processors on the machine is used
+        **kwargs: other arguments of the TheoryBDD constructor, such as dynamic_reorder,
+            used for every T-BDD. They must be picklable
+
+    Returns:
+        List[Dict]: the computation logger of each T-BDD construction
+
+    Raises:
+        ValueError: if the number of folders is not the number of formulas,
+            or if computation_logger or folder_name are passed in kwargs
+    """
+    if len(phis) != len(folder_paths):
+        raise ValueError("Expected one folder path for each formula")
+    if "computation_logger" in kwargs or "folder_name" in kwargs:
+        raise ValueError(
+            "computation_logger and folder_name are set by each worker"
+        )
+    # FNodes belong to the pysmt environment of this process,
+    # so formulas are sent to the workers as SMT-LIB scripts
+    serialized_phis = [formula.serialize_phi(phi) for phi in phis]
+    with ProcessPoolExecutor(max_workers=n_workers) as executor:
+        return list(
+            executor.map(
+                functools.partial(_build_and_save_tbdd, **kwargs),
+                serialized_phis,
+                [solver] * len(phis),
+                folder_paths,
+            )
+        )
+
+
+def build_many(
+    phis: List[FNode], solver: str = "total", workers: int | None = None, **kwargs
+) -> List[TheoryBDD]:
+    """Builds the T-BDDs of independent formulas in parallel
+
+    The T-BDDs are built by build_tbdds_parallel in a temporary folder
+    and then loaded in this process
+
+    Args:
+        phis (List[FNode]): the pysmt formulas to compile
+        solver (str) ["total"]: the name of the solver to use for All-SMT computation
+        workers (int | None) [None]: the number of worker processes.
+            If None, the number of processors on the machine is used
+        **kwargs: other arguments of the TheoryBDD constructor, used for every T-BDD
+
+    Returns:
+        List[TheoryBDD]: the T-BDD of each formula, in the same order
+    """
+    with tempfile.TemporaryDirectory() as temporary_folder:
+        folder_paths = [f"{temporary_folder}/{i}" for i in range(len(phis))]
+        build_tbdds_parallel(
+            phis, folder_paths, solver=solver, n_workers=workers, **kwargs
+        )
+        return [tbdd_load_from_folder(folder_path) for folder_path in folder_paths]
 
 
 def tbdd_load_from_folder(folder_path: str) -> TheoryBDD:
@@ -1,19 +1,58 @@
 """interface for the theory DD classes"""
 
 from abc import ABC, abstractmethod
+from collections import OrderedDict
+from contextlib import contextmanager
 import logging
+import os
+import pickle
 import time
-from typing import Dict, List, Tuple
+from typing import Dict, FrozenSet, Iterator, List, Tuple
+import weakref
 
 from pysmt.fnode import FNode
 
 from theorydd import formula
 from theorydd.solvers.lemma_extractor import extract
 from theorydd.solvers.solver import SMTEnumerator
-from theorydd.util._string_generator import SequentialStringGenerator
 from theorydd.walkers.walker_bdd import BDDWalker
 from theorydd.walkers.walker_sdd import SDDWalker
 
+# identifies qvars files saved in the binary format
+_QVARS_FILE_HEADER = b"TDDQVARS\x01"
+
+# All-SMT results of each solver by normalized phi, so that T-DDs built
+# again on the same formula with the same solver skip the enumeration.
+# Only the most recent formulas of each solver are kept
+_LEMMAS_CACHE: "weakref.WeakKeyDictionary[SMTEnumerator, OrderedDict[FNode, Tuple[bool, List[FNode]]]]" = (
+    weakref.WeakKeyDictionary()
+)
+_LEMMAS_CACHE_SIZE = 8
+
+
+def clear_lemmas_cache(solver: SMTEnumerator | None = None) -> None:
+    """forgets the All-SMT results remembered for the construction of T-DDs
+
+    Args:
+        solver (SMTEnumerator | None) [None]: the solver whose results are forgotten.
+            If None, the results of all the solvers are forgotten
+    """
+    if solver is None:
+        _LEMMAS_CACHE.clear()
+    else:
+        _LEMMAS_CACHE.pop(solver, None)
+
+
+def _get_atoms_order(
+    phi_and_lemmas: FNode, atoms: List[FNode], max_reduction: bool
+) -> List[FNode]:
+    """orders the atoms of phi and lemmas"""
+    ordered_atoms = formula.get_atoms_dfs_order(phi_and_lemmas, atoms)
+    ordered_atoms = formula.get_atoms_min_fill_order(phi_and_lemmas, ordered_atoms)
+    if max_reduction:
+        ordered_atoms = formula.get_atoms_max_reduction_order(phi_and_lemmas, ordered_atoms)
+    return ordered_atoms
+
 
 class TheoryDD(ABC):
     """interface for the theory DD classes
@@ -21,22 +60,60 @@ class TheoryDD(ABC):
     This interface must be implemented by all the theory DDs that are used to compute all-SMT.
     """
 
+    # loggers are shared by all the instances of a class,
+    # subclasses override them with their own logger
+    logger: logging.Logger = logging.getLogger("theorydd_tdd")
+    # keys of the phases of a construction in its computation log,
+    # in the order in which they are run
+    _log_keys: Tuple[str, ...] = (
+        "phi normalization time",
+        "ALL SMT mode",
+        "lemmas loading time",
+        "fresh T-atoms detected",
+        "fresh T-atoms detection time",
+        "variable ordering time",
+        "variable mapping creation time",
+        "DD preparation time",
+    )
+
     def __init__(self):
         self.abstraction = {}
         self.refinement = {}
         self.qvars = []
-        self.logger = logging.getLogger("theorydd_tdd")
+        self._qvar_labels = None
+        self._care_vars = None
+
+    def _new_computation_log(self) -> Dict:
+        """returns the computation log of a new construction,
+        with all the keys that every construction records already in place
+
+        The keys are set to None, which stays in the log for the phases that are not run"""
+        return dict.fromkeys(self._log_keys)
+
+    @contextmanager
+    def _timed(
+        self, computation_logger: Dict, key: str, message: str
+    ) -> Iterator[None]:
+        """times a phase of the construction
+
+        Args:
+            computation_logger (Dict): the dictionary where the elapsed time is stored
+            key (str): the key under which the elapsed time is stored
+            message (str): the message logged with the elapsed time once the phase is completed
+        """
+        start_time = time.perf_counter()
+        yield
+        elapsed_time = time.perf_counter() - start_time
+        self.logger.info("%s in %s seconds", message, elapsed_time)
+        computation_logger[key] = elapsed_time
 
     def _normalize_input(
         self, phi: FNode, solver: SMTEnumerator, computation_logger: Dict
     ) -> FNode:
         """normalizes the input"""
-        start_time = time.time()
         self.logger.info("Normalizing phi according to solver...")
-        phi = formula.get_normalized(phi, solver.get_converter())
-        elapsed_time = time.time() - start_time
-        self.logger.info("Phi was normalized in %s seconds",str(elapsed_time))
-        computation_logger["phi normalization time"] = elapsed_time
+        with self._timed(computation_logger, "phi normalization time", "Phi was normalized"):
+            phi = solver.get_normalizer().walk(phi)
         return phi
 
     def _load_lemmas(
@@ -50,45 +127,101 @@ class TheoryDD(ABC):
     ) -> Tuple[List[FNode], bool]:
         """loads the lemmas"""
         # LOADING LEMMAS
-        start_time = time.time()
         self.logger.info("Loading Lemmas...")
+        with self._timed(computation_logger, "lemmas loading time", "Lemmas loaded"):
+            tlemmas, sat_result = self._get_lemmas(
+                phi, smt_solver, tlemmas, load_lemmas, sat_result, computation_logger
+            )
+        return tlemmas, sat_result
+
+    def _get_lemmas(
+        self,
+        phi: FNode,
+        smt_solver: SMTEnumerator,
+        tlemmas: List[FNode] | None,
+        load_lemmas: str | None,
+        sat_result: bool,
+        computation_logger: Dict,
+    ) -> Tuple[List[FNode], bool]:
+        """gets the normalized lemmas from the arguments, from a file,
+        from the lemmas cache or from the All-SMT computation"""
+        lemmas_normalized = False
         if tlemmas is not None:
             computation_logger["ALL SMT mode"] = "loaded"
         elif load_lemmas is not None:
             computation_logger["ALL SMT mode"] = "loaded"
             tlemmas = [formula.read_phi(load_lemmas)]
         else:
-            computation_logger["ALL SMT mode"] = "computed"
-            sat_result, tlemmas, _bm = extract(
-                phi,
-                smt_solver,
-                computation_logger=computation_logger,
-            )
-        tlemmas = list(
-            map(
-                lambda l: formula.get_normalized(l, smt_solver.get_converter()), tlemmas
+            solver_cache = _LEMMAS_CACHE.setdefault(smt_solver, OrderedDict())
+            if phi in solver_cache:
+                computation_logger["ALL SMT mode"] = "cached"
+                solver_cache.move_to_end(phi)
+                sat_result, tlemmas = solver_cache[phi]
+            else:
+                computation_logger["ALL SMT mode"] = "computed"
+                sat_result, tlemmas, _bm = extract(
+                    phi,
+                    smt_solver,
+                    computation_logger=computation_logger,
+                )
+                solver_cache[phi] = (sat_result, list(tlemmas))
+                if len(solver_cache) > _LEMMAS_CACHE_SIZE:
+                    solver_cache.popitem(last=False)
+            # lemmas found by the solver may already be normalized
+            lemmas_normalized = smt_solver.are_lemmas_normalized()
+        if not lemmas_normalized:
+            # the lemmas are normalized by the same walker as phi,
+            # so the atoms they share with phi are not converted again
+            tlemmas = formula.get_normalized_batch(
+                tlemmas, smt_solver.get_converter(), smt_solver.get_normalizer()
             )
-        )
-        # BASICALLY PADDING TO AVOID POSSIBLE ISSUES
-        while len(tlemmas) < 2:
-            tlemmas.append(formula.top())
-        elapsed_time = time.time() - start_time
-        self.logger.info("Lemmas loaded in %s seconds", str(elapsed_time))
-        computation_logger["lemmas loading time"] = elapsed_time
         return tlemmas, sat_result
 
+    def _get_atoms(
+        self,
+        phi_and_lemmas: FNode,
+        smt_solver: SMTEnumerator,
+        computation_logger: Dict,
+    ) -> List[FNode]:
+        """returns the atoms of phi and lemmas
+
+        If the lemmas were computed during construction, the atoms
+        collected by the solver are reused instead of walking phi and lemmas again"""
+        if computation_logger.get("ALL SMT mode") == "computed":
+            atoms = smt_solver.get_atoms()
+            if atoms is not None:
+                return atoms
+        return formula.get_atoms(phi_and_lemmas)
+
+    def _order_atoms(
+        self,
+        phi_and_lemmas: FNode,
+        atoms: List[FNode],
+        computation_logger: Dict,
+        max_reduction: bool = False,
+    ) -> List[FNode]:
+        """orders the atoms over phi and lemmas with the min-fill heuristic,
+        breaking ties by depth-first appearance order.
+        If max_reduction is True, the min-fill order is then refined
+        with the max-reduction heuristic when phi and lemmas is small enough
+
+        The DD variables follow the returned order"""
+        self.logger.info("Ordering atoms...")
+        with self._timed(computation_logger, "variable ordering time", "Atoms ordered"):
+            atoms = _get_atoms_order(phi_and_lemmas, atoms, max_reduction)
+        return atoms
+
     def _build_unsat(
         self, walker: BDDWalker | SDDWalker, computation_logger: Dict
     ) -> object:
         """builds the T-DD for an UNSAT formula
 
         Returns the root of the DD"""
-        start_time = time.time()
         self.logger.info("Building T-DD for UNSAT formula...")
-        root = walker.walk(formula.bottom())
-        elapsed_time = time.time() - start_time
-        self.logger.info("T-DD for UNSAT formula built in %s seconds", str(elapsed_time))
-        computation_logger["UNSAT DD building time"] = elapsed_time
+        with self._timed(
+            computation_logger, "UNSAT DD building time", "T-DD for UNSAT formula built"
+        ):
+            root = walker.walk(formula.bottom())
         return root
 
     def _build(
@@ -99,45 +232,147 @@ class TheoryDD(ABC):
         computation_logger: Dict,
     ) -> None:
         """Builds the T-DD"""
-        # DD for phi
-        start_time = time.time()
-        self.logger.info("Building DD for phi...")
-        phi_bdd = walker.walk(phi)
-        elapsed_time = time.time() - start_time
-        self.logger.info("DD for phi built in %s seconds", str(elapsed_time))
-        computation_logger["phi DD building time"] = elapsed_time
+        # no lemmas were found, or they are all valid:
+        # phi & lemmas is phi itself and there are no fresh T-atoms
+        if all(tlemma.is_true() for tlemma in tlemmas):
+            self.logger.info("Building DD for phi...")
+            with self._timed(computation_logger, "phi DD building time", "DD for phi built"):
+                phi_bdd = walker.walk(phi)
+            self.logger.info("No T-lemmas to join, the T-DD is the DD for phi")
+            computation_logger["t-lemmas DD building time"] = 0
+            computation_logger["DD joining time"] = 0
+            return phi_bdd
 
         # DD for t-lemmas
-        start_time = time.time()
+        # the lemmas are built before phi, so that phi is not walked
+        # at all when their conjunction is already inconsistent
         self.logger.info("Building T-DD for big and of t-lemmas...")
-        tlemmas_dd = walker.walk(formula.big_and(tlemmas))
-        elapsed_time = time.time() - start_time
-        self.logger.info("DD for T-lemmas built in %s seconds", str(elapsed_time))
-        computation_logger["t-lemmas DD building time"] = elapsed_time
-
-        # ENUMERATING OVER FRESH T-ATOMS
-        mapped_qvars = [self.abstraction[atom] for atom in self.qvars]
-        if len(mapped_qvars) > 0:
-            start_time = time.time()
-            self.logger.info("Enumerating over fresh T-atoms...")
-            tlemmas_dd = self._enumerate_qvars(tlemmas_dd, mapped_qvars)
-            elapsed_time = time.time() - start_time
-            self.logger.info(
-                    "fresh T-atoms quantification completed in %s seconds", str(elapsed_time)
-                )
-            computation_logger["fresh T-atoms quantification time"] = elapsed_time
-        else:
-            computation_logger["fresh T-atoms quantification time"] = 0
-
-        # JOINING PHI BDD AND TLEMMAS BDD
-        start_time = time.time()
-        self.logger.info("Joining phi DD and lemmas T-DD...")
-        root = phi_bdd & tlemmas_dd
-        elapsed_time = time.time() - start_time
-        self.logger.info("T-DD for phi and t-lemmas joint in %s seconds", str(elapsed_time))
-        computation_logger["DD joining time"] = elapsed_time
+        with self._timed(
+            computation_logger, "t-lemmas DD building time", "DD for T-lemmas built"
+        ):
+            # the lemmas are conjoined one at a time in the DD manager
+            # instead of walking a single FNode for the big and of all of them.
+            # T-lemmas are mostly clauses, so the ones with fewer arguments
+            # have smaller DDs and are conjoined first, valid lemmas are skipped
+            tlemmas = sorted(
+                (tlemma for tlemma in tlemmas if not tlemma.is_true()),
+                key=lambda tlemma: len(tlemma.args()),
+            )
+            false_dd = walker.walk(formula.bottom())
+            tlemmas_dd = walker.walk(tlemmas[0])
+            for tlemma in tlemmas[1:]:
+                if tlemmas_dd == false_dd:
+                    # the conjunction cannot change anymore
+                    break
+                tlemmas_dd = tlemmas_dd & walker.walk(tlemma)
+
+        # the join of anything with false is false, even after enumerating
+        # over the fresh T-atoms
+        if tlemmas_dd == false_dd:
+            self.logger.info("T-lemmas are inconsistent, the T-DD is false")
+            computation_logger["phi DD building time"] = 0
+            computation_logger["DD joining time"] = 0
+            return false_dd
+
+        # DD for phi
+        self.logger.info("Building DD for phi...")
+        with self._timed(computation_logger, "phi DD building time", "DD for phi built"):
+            phi_bdd = walker.walk(phi)
+
+        # valid lemmas do not constrain phi, and phi does not contain
+        # the fresh T-atoms, so there is nothing to join or enumerate
+        if tlemmas_dd == walker.walk(formula.top()):
+            self.logger.info("T-lemmas are valid, the T-DD is the DD for phi")
+            computation_logger["DD joining time"] = 0
+            return phi_bdd
+
+        # JOINING PHI BDD AND TLEMMAS BDD, ENUMERATING OVER FRESH T-ATOMS
+        # the fresh T-atoms never appear in phi, so they can be quantified
+        # together with the conjunction instead of on the T-lemmas DD alone
+        # the time of the quantification over fresh T-atoms is part of the join
+        mapped_qvars = list(self._get_qvar_labels())
+        with self._timed(
+            computation_logger, "DD joining time", "T-DD for phi and t-lemmas joint"
+        ):
+            if len(mapped_qvars) > 0:
+                self.logger.info("Joining phi DD and lemmas T-DD enumerating over fresh T-atoms...")
+                root = self._join_enumerating_qvars(phi_bdd, tlemmas_dd, mapped_qvars)
+            else:
+                self.logger.info("Joining phi DD and lemmas T-DD...")
+                root = phi_bdd & tlemmas_dd
         return root
 
+    def _scan_folder(self, folder_path: str, file_names: List[str]) -> Dict[str, str]:
+        """lists the files in the folder of a saved T-DD with a single directory scan
+
+        Args:
+            folder_path (str): the path to the folder where the data is stored
+            file_names (List[str]): the names of the files that must be in the folder
+
+        Returns:
+            Dict[str, str]: the path of each file in the folder, by file name
+
+        Raises:
+            FileNotFoundError: if the folder or one of the files does not exist
+        """
+        try:
+            with os.scandir(folder_path) as entries:
+                paths = {entry.name: entry.path for entry in entries}
+        except FileNotFoundError as e:
+            raise FileNotFoundError(
+                f"Folder {folder_path} does not exist, cannot load T-DD"
+            ) from e
+        missing_files = [name for name in file_names if name not in paths]
+        if len(missing_files) > 0:
+            raise FileNotFoundError(
+                f"Files {missing_files} are missing from folder {folder_path}, cannot load T-DD"
+            )
+        return paths
+
+    def _get_qvar_labels(self) -> FrozenSet:
+        """gets the labels of the variables in self.qvars
+
+        The result is computed once, since neither the abstraction
+        nor the qvars change after the T-DD is built"""
+        if self._qvar_labels is None:
+            self._qvar_labels = frozenset(self.abstraction[qvar] for qvar in self.qvars)
+        return self._qvar_labels
+
+    def _get_care_vars(self) -> FrozenSet:
+        """gets the labels of the variables that are not in self.qvars
+
+        The result is computed once, since neither the abstraction
+        nor the qvars change after the T-DD is built"""
+        if self._care_vars is None:
+            self._care_vars = frozenset(self.abstraction.values()) - self._get_qvar_labels()
+        return self._care_vars
+
+    def _save_qvars(self, folder_path: str) -> None:
+        """saves the labels of the qvars in the specified folder
+
+        The labels are pickled after a header that identifies the format.
+        They are sorted, so that the same qvars are always saved in the same file"""
+        qvars_indexes = sorted(self._get_qvar_labels())
+        with open(f"{folder_path}/qvars.qvars", "wb", buffering=1 << 16) as out:
+            out.write(_QVARS_FILE_HEADER)
+            pickle.dump(qvars_indexes, out, protocol=5)
+
+    def _load_qvars(self, folder_path: str) -> None:
+        """loads the qvars from their labels saved in the specified folder
+
+        Files saved as JSON by previous versions are still supported.
+        The refinement must already be loaded"""
+        with open(f"{folder_path}/qvars.qvars", "rb") as input_data:
+            data = input_data.read()
+        if data.startswith(_QVARS_FILE_HEADER):
+            # the header is skipped without copying the rest of the data
+            qvars_indexes = pickle.loads(memoryview(data)[len(_QVARS_FILE_HEADER) :])
+        else:
+            qvars_indexes = formula.json_loads(data)
+        self.qvars = [self.refinement[qvar_id] for qvar_id in qvars_indexes]
+        self._qvar_labels = frozenset(qvars_indexes)
+        self._care_vars = None
+
     @abstractmethod
     def _enumerate_qvars(
         self, tlemmas_dd: object, mapped_qvars: List[object]
@@ -145,6 +380,13 @@ class TheoryDD(ABC):
         """enumerates over the fresh T-atoms"""
         raise NotImplementedError()
 
+    def _join_enumerating_qvars(
+        self, phi_dd: object, tlemmas_dd: object, mapped_qvars: List[object]
+    ) -> object:
+        """conjoins the DD of phi and the DD of the T-lemmas
+        and enumerates over the fresh T-atoms in the result"""
+        return self._enumerate_qvars(phi_dd & tlemmas_dd, mapped_qvars)
+
     @abstractmethod
     def _load_from_folder(self, folder_path: str):
         """loads the DD from a folder"""
@@ -1,19 +1,17 @@
 """theory SDD module"""
 
 from array import array
-import json
 import logging
 import os
 import time
-from typing import Dict, Generator, List, Set
+from typing import Dict, FrozenSet, Generator, List, Set, Tuple
 from pysmt.fnode import FNode
-from pysdd.sdd import SddManager, Vtree, SddNode, WmcManager
+from pysdd.sdd import SddManager, Vtree, SddNode
 from theorydd import formula
 from theorydd.solvers.lemma_extractor import find_qvars
 from theorydd.solvers.solver import SMTEnumerator
 from theorydd.tdd.theory_dd import TheoryDD
-from theorydd.formula import get_atoms
-from theorydd.util._utils import get_solver as _get_solver
+from theorydd.util._utils import get_solver as _get_solver, sdd_model_count as _sdd_model_count
 from theorydd.walkers.walker_sdd import SDDWalker
 from theorydd.util._dd_dump_util import save_sdd_object as _save_sdd_object
 from theorydd.constants import VALID_VTREE, SAT
@@ -34,6 +32,18 @@ class TheorySDD(TheoryDD):
     refinement: Dict[int, FNode]
     vtree: Vtree
     atom_literal_map: Dict  # Dict[FNode, SddLiteral]
+    logger: logging.Logger = logging.getLogger("theorydd_tsdd")
+    _qvar_labels: FrozenSet[int] | None
+    _care_vars: FrozenSet[int] | None
+    _refined_atoms: List[FNode | None] | None
+    _existential_map: array | None
+    _cached_len: int | None
+    _cached_vertices: int | None
+    _cached_models: int | None
+    # the V-Tree is built between the mapping and the preparation phase
+    _log_keys: Tuple[str, ...] = (
+        TheoryDD._log_keys[:-1] + ("V-Tree building time",) + TheoryDD._log_keys[-1:]
+    )
 
     def __init__(
         self,
@@ -45,6 +55,7 @@ class TheorySDD(TheoryDD):
         tlemmas: List[FNode] = None,
         vtree_type: str = "balanced",
         folder_name: str | None = None,
+        max_reduction_order: bool = False,
     ) -> None:
         """Builds a T-SDD. The construction requires the
         computation of All-SMT for the provided formula to
@@ -65,9 +76,16 @@ class TheorySDD(TheoryDD):
             computation_logger (Dict) [None]: a dictionary that will be updated to store computation info
             folder_name (str | None) [None]: the path to a folder where data to load the T-SDD is stored.
                 If this is not None, then all other parameters are ignored
+            max_reduction_order (bool) [False]: if True, the variable order is refined with the
+                max-reduction heuristic, which is only applied to small formulas and can be slow
         """
         super().__init__()
-        self.logger = logging.getLogger("theorydd_tsdd")
+        self._refined_atoms = None
+        self._existential_map = None
+        # sizes of the current root, cleared whenever the root changes
+        self._cached_len = None
+        self._cached_vertices = None
+        self._cached_models = None
 
         if folder_name is not None:
             self._load_from_folder(folder_name)
@@ -82,7 +100,7 @@ class TheorySDD(TheoryDD):
         if computation_logger is None:
             computation_logger = {}
         if computation_logger.get("T-SDD") is None:
-            computation_logger["T-SDD"] = {}
+            computation_logger["T-SDD"] = self._new_computation_log()
         # get the solver
         if isinstance(solver, str):
             smt_solver = _get_solver(solver)
@@ -105,89 +123,106 @@ class TheorySDD(TheoryDD):
         # COMPUTE PHI AND LEMMAS
         phi_and_lemmas = formula.get_phi_and_lemmas(phi, tlemmas)
 
+        # the atoms of phi and lemmas are collected once,
+        # both the fresh T-atoms and the mapping are computed from them
+        atoms = self._get_atoms(
+            phi_and_lemmas, smt_solver, computation_logger["T-SDD"]
+        )
+
         # FINDING QVARS
         self.qvars = find_qvars(
             phi,
             phi_and_lemmas,
             computation_logger=computation_logger["T-SDD"],
+            atoms=atoms,
         )
 
-        atoms = get_atoms(phi_and_lemmas)
+        # the labels and the V-Tree follow the order of the atoms.
+        # The T-DD of an UNSAT formula is false whatever the order,
+        # so its atoms are not ordered
+        if sat_result is None or sat_result == SAT:
+            atoms = self._order_atoms(
+                phi_and_lemmas, atoms, computation_logger["T-SDD"], max_reduction_order
+            )
 
         # CREATING VARIABLE MAPPING
         self.abstraction = self._compute_mapping(atoms, computation_logger["T-SDD"])
-        self.refinement = {v: k for k, v in self.abstraction.items()}
 
         # BUILDING V-TREE
         self._build_vtree(vtree_type, computation_logger["T-SDD"])
 
         # BUILDING SDD WITH WALKER
-        start_time = time.time()
         self.logger.info("Preparing to build T-SDD...")
-        self.manager = SddManager.from_vtree(self.vtree)
-        sdd_literals = [
-            self.manager.literal(i) for i in range(1, len(self.abstraction.keys()) + 1)
-        ]
-        self.atom_literal_map = self._get_atom_literal_map(sdd_literals)
-        walker = SDDWalker(self.atom_literal_map, self.manager)
-        elapsed_time = time.time() - start_time
-        self.logger.info(
-            "SDD preparation phase completed in %s seconds", str(elapsed_time)
-        )
-        computation_logger["T-SDD"]["DD preparation time"] = elapsed_time
+        with self._timed(
+            computation_logger["T-SDD"], "DD preparation time", "SDD preparation phase completed"
+        ):
+            self.manager = SddManager.from_vtree(self.vtree)
+            self.atom_literal_map = self._get_atom_literal_map()
+            walker = SDDWalker(self.atom_literal_map, self.manager)
 
         if sat_result is None or sat_result == SAT:
             self.root = self._build(phi, tlemmas, walker, computation_logger["T-SDD"])
         else:
             self.root = self._build_unsat(walker, computation_logger["T-SDD"])
 
-    def _get_atom_literal_map(self, sdd_literals) -> Dict:
-        """computes the atom literal map"""
-        var_count = len(self.abstraction.keys())
-        atom_to_literal_map = {}
-        for i in range(1, var_count + 1):
-            atom_to_literal_map[self.refinement[i]] = sdd_literals[i - 1]
-        return atom_to_literal_map
+    def _get_atom_literal_map(self) -> Dict:
+        """computes the atom literal map
+
+        Atoms are looked up by label, so the refinement may be in any order"""
+        refinement = self.refinement
+        literal = self.manager.literal
+        return {refinement[i]: literal(i) for i in range(1, len(refinement) + 1)}
 
     def _compute_mapping(
         self, atoms: List[FNode], computation_logger: dict
     ) -> Dict[FNode, int]:
-        """computes the mapping"""
-        start_time = time.time()
+        """computes the mapping
+
+        The refinement is built in the same pass and stored in self.refinement"""
         self.logger.info("Creating mapping...")
-        mapping = {}
-        count = 1
-        for atom in atoms:
-            mapping[atom] = count
-            count += 1
-        elapsed_time = time.time() - start_time
-        self.logger.info("Mapping created in %s seconds", str(elapsed_time))
-        computation_logger["variable mapping creation time"] = elapsed_time
+        with self._timed(computation_logger, "variable mapping creation time", "Mapping created"):
+            mapping = {}
+            refinement = {}
+            for label, atom in enumerate(atoms, 1):
+                mapping[atom] = label
+                refinement[label] = atom
+            self.refinement = refinement
         return mapping
 
     def _enumerate_qvars(self, tlemmas_dd, mapped_qvars) -> object:
         """Enumerates over the fresh T-atoms in the T-lemmas"""
-        existential_map = [0]
-        for smt_atom in self.atom_literal_map.keys():
-            if smt_atom in self.qvars:
-                existential_map.append(1)
-            else:
-                existential_map.append(0)
-        return self.manager.exists_multiple(array("i", existential_map), tlemmas_dd)
+        return self.manager.exists_multiple(self._get_existential_map(), tlemmas_dd)
+
+    def _get_existential_map(self) -> array:
+        """gets the existential map of the qvars, an int array indexed
+        by SDD variable label with 1 for each qvar (label 0 is unused)
+
+        The map is computed once, since neither the abstraction
+        nor the qvars change after the T-SDD is built"""
+        if self._existential_map is None:
+            existential_map = array("i", [0]) * (len(self.abstraction) + 1)
+            for label in self._get_qvar_labels():
+                existential_map[label] = 1
+            self._existential_map = existential_map
+        return self._existential_map
 
     def _build_vtree(self, vtree_type, computation_logger: Dict) -> None:
-        start_time = time.time()
         self.logger.info("Building V-Tree...")
-        # for now just use appearance order in phi
-        var_count = len(self.abstraction.keys())
-        var_order = list(range(1, var_count + 1))
-        self.vtree = Vtree(var_count, var_order, vtree_type)
-        elapsed_time = time.time() - start_time
-        self.logger.info("V-Tree built in %s seconds", str(elapsed_time))
-        computation_logger["V-Tree building time"] = elapsed_time
+        with self._timed(computation_logger, "V-Tree building time", "V-Tree built"):
+            # the labels follow the order of the atoms,
+            # which is the default left-to-right order 1, ..., var_count
+            # of the vtree, so no explicit order list is passed
+            var_count = len(self.abstraction.keys())
+            self.vtree = Vtree(var_count=var_count, vtree_type=vtree_type)
 
     def __len__(self) -> int:
-        return max(self.root.count(), 1)
+        if self._cached_len is None:
+            if self.root.is_true() or self.root.is_false():
+                # a constant root is a single node, no need to traverse it
+                self._cached_len = 1
+            else:
+                self._cached_len = max(self.root.count(), 1)
+        return self._cached_len
 
     def count_nodes(self) -> int:
         """Returns the number of nodes in the T-SDD"""
@@ -195,33 +230,32 @@ class TheorySDD(TheoryDD):
 
     def count_vertices(self) -> int:
         """Returns the number of nodes in the T-SDD"""
+        if self._cached_vertices is None:
+            self._cached_vertices = self._count_vertices()
+        return self._cached_vertices
+
+    def _count_vertices(self) -> int:
+        """counts the edges of the T-SDD with a traversal from the root"""
         if self.root.is_true() or not self.root.is_decision() or self.root.is_false():
             return 0
-        else:
-            elems = self.root.elements()
-            queue: List[SddNode] = []
-            for elem in elems:
-                queue.extend([elem[0], elem[1]])
-            total_edges = len(elems)
-            visited: Set[SddNode] = set()
-            visited.add(self.root)
-            while len(queue) > 0:
-                first = queue.pop(0)
-                if first.is_decision():
-                    total_edges += 1
-                    if not first in visited:
-                        elems = first.elements()
-                        for elem in elems:
-                            queue.extend([elem[0], elem[1]])
-                            total_edges += 1
-                    visited.add(first)
-            return total_edges
-
-    def _get_care_vars(self) -> List[int]:
-        """gets the labels of the variables that are not in self.qvars"""
-        mapped_qvars = set([self.abstraction[i] for i in self.qvars])
-        all_vars = set(self.abstraction.values())
-        return all_vars.difference(mapped_qvars)
+        # every decision node is expanded once, even if it is shared,
+        # and has an edge to the prime and to the sub of each element.
+        # nodes are visited depth first, so children follow their parent,
+        # and are marked as visited when pushed, so each is pushed only once
+        stack: List[SddNode] = [self.root]
+        visited: Set[SddNode] = {self.root}
+        total_edges = 0
+        while stack:
+            elems = stack.pop().elements()
+            total_edges += 2 * len(elems)
+            for prime, sub in elems:
+                if prime.is_decision() and prime not in visited:
+                    visited.add(prime)
+                    stack.append(prime)
+                if sub.is_decision() and sub not in visited:
+                    visited.add(sub)
+                    stack.append(sub)
+        return total_edges
 
     def is_sat(self) -> bool:
         """Returns True if the encoded formula is satisfiable"""
@@ -248,11 +282,24 @@ class TheorySDD(TheoryDD):
         if negated:
             condition_sdd = ~condition_sdd
         self.root = self.root & condition_sdd
+        self._cached_len = None
+        self._cached_vertices = None
+        self._cached_models = None
 
     def count_models(self) -> int:
         """Returns the amount of models in the T-SDD"""
-        wmc: WmcManager = self.root.wmc(log_mode=False)
-        return wmc.propagate() / (2 ** len(self.qvars))
+        if self._cached_models is None:
+            self._cached_models = self._count_models()
+        return self._cached_models
+
+    def _count_models(self) -> int:
+        """counts the models of the T-SDD"""
+        # constant roots are counted without propagating weights on the SDD
+        if self.root.is_false():
+            return 0
+        if self.root.is_true():
+            return 2 ** (len(self.refinement) - len(self.qvars))
+        return _sdd_model_count(self.root, self.manager) // (2 ** len(self.qvars))
 
     def graphic_dump(
         self,
@@ -283,7 +330,7 @@ class TheorySDD(TheoryDD):
         ):
             elapsed_time = time.time() - start_time
             self.logger.info(
-                "SDD saved as %s in %s seconds", output_file, str(elapsed_time)
+                "SDD saved as %s in %s seconds", output_file, elapsed_time
             )
         else:
             self.logger.info(
@@ -309,37 +356,47 @@ class TheorySDD(TheoryDD):
     
     def _refine_model(self, model: Dict[int,int]) -> Dict[FNode, bool]:
         """Refines a model from the SDD to the original formula"""
-        refined_model = {}
-        for key, value in model.items():
-            atom = self.refinement[key]
-            if atom in self.qvars:
-                continue
-            if value == 0:
-                refined_model[atom] = False
-            else:
-                refined_model[atom] = True
-        return refined_model
+        refined_atoms = self._get_refined_atoms()
+        return {
+            refined_atoms[key]: value != 0
+            for key, value in model.items()
+            if refined_atoms[key] is not None
+        }
+
+    def _get_refined_atoms(self) -> List[FNode | None]:
+        """gets a list that maps each SDD variable label to its atom,
+        with None in place of the qvars and of the unused label 0
+
+        The list is computed once, since the labels are the integers
+        from 1 to the number of atoms and do not change after the T-SDD is built"""
+        if self._refined_atoms is None:
+            refined_atoms = [None] * (len(self.refinement) + 1)
+            for label in self._get_care_vars():
+                refined_atoms[label] = self.refinement[label]
+            self._refined_atoms = refined_atoms
+        return self._refined_atoms
 
     def pick(self) -> Dict[FNode, bool] | None:
         """Returns a model of the encoded formula"""
         if not self.is_sat():
             return None
-        for mod in self.root.models():
-            return self._refine_model(mod)
-        
+        models = self.root.models()
+        try:
+            return self._refine_model(next(models))
+        finally:
+            # release the enumeration state right away instead of at GC time
+            models.close()
+
     def pick_all_iter(self) -> Generator[Dict[FNode, bool], None, None]:
         """Returns an iterator over the models of the encoded formula"""
+        if not self.is_sat():
+            return
         for mod in self.root.models():
             yield self._refine_model(mod)
 
     def pick_all(self) -> List[Dict[FNode, bool]]:
         """returns a list of all the models in the encoded formula"""
-        if not self.is_sat():
-            return []
-        items = []
-        for mod in self.root.models():
-            items.append(self._refine_model(mod))
-        return items
+        return list(self.pick_all_iter())
 
     def save_to_folder(self, folder_path: str) -> None:
         """Save the T-SDD in the specified solver
@@ -347,9 +404,8 @@ class TheorySDD(TheoryDD):
         Args:
             folder_path (str): the path to the output folder
         """
-        # check if folder exists
-        if not os.path.exists(folder_path):
-            os.makedirs(folder_path)
+        # create the folder if it does not exist
+        os.makedirs(folder_path, exist_ok=True)
         # save vtree
         self.save_vtree_to_folder(folder_path)
         # save mapping
@@ -357,11 +413,9 @@ class TheorySDD(TheoryDD):
             self.abstraction, folder_path + "/abstraction.json"
         )
         # SAVE QVARS
-        qvars_indexes = [self.abstraction[qvar] for qvar in self.qvars]
-        with open(f"{folder_path}/qvars.qvars", "w", encoding="utf8") as out:
-            json.dump(qvars_indexes, out)
+        self._save_qvars(folder_path)
         # save sdd
-        self.root.save(str.encode(folder_path + "/sdd.sdd"))
+        self.root.save(os.fsencode(os.path.join(folder_path, "sdd.sdd")))
 
     def save_vtree_to_folder(self, folder_path: str) -> None:
         """Save the V-Tree in the specified folder
@@ -369,9 +423,8 @@ class TheorySDD(TheoryDD):
         Args:
             folder_path (str): the path to the output folder
         """
-        if not os.path.exists(folder_path):
-            os.makedirs(folder_path)
-        self.vtree.save(str.encode(folder_path + "/vtree.vtree"))
+        os.makedirs(folder_path, exist_ok=True)
+        self.vtree.save(os.fsencode(os.path.join(folder_path, "vtree.vtree")))
 
     def _load_from_folder(self, folder_path: str) -> None:
         """
@@ -380,22 +433,17 @@ class TheorySDD(TheoryDD):
         Args:
             folder_path (str): the path to the folder where the data is stored
         """
-        if not os.path.exists(folder_path):
-            raise FileNotFoundError("The folder does not exist")
-        self.vtree = vtree_load_from_folder(folder_path)
-        self.abstraction = formula.load_abstraction_function(
-            folder_path + "/abstraction.json"
+        paths = self._scan_folder(
+            folder_path, ["vtree.vtree", "abstraction.json", "sdd.sdd", "qvars.qvars"]
         )
+        self.vtree = Vtree(filename=paths["vtree.vtree"])
+        self.abstraction = formula.load_abstraction_function(paths["abstraction.json"])
         self.manager = SddManager.from_vtree(self.vtree)
+        # the abstraction is saved in label order
         self.refinement = {v: k for k, v in self.abstraction.items()}
-        sdd_literals = [
-            self.manager.literal(i) for i in range(1, len(self.abstraction.keys()) + 1)
-        ]
-        self.atom_literal_map = self._get_atom_literal_map(sdd_literals)
-        self.root = self.manager.read_sdd_file(str.encode(f"{folder_path}/sdd.sdd"))
-        with open(f"{folder_path}/qvars.qvars", "r", encoding="utf8") as input_data:
-            qvars_indexes = json.load(input_data)
-            self.qvars = [self.refinement[qvar_id] for qvar_id in qvars_indexes]
+        self.atom_literal_map = self._get_atom_literal_map()
+        self.root = self.manager.read_sdd_file(os.fsencode(paths["sdd.sdd"]))
+        self._load_qvars(folder_path)
 
 
 def vtree_load_from_folder(folder_path: str) -> Vtree:
@@ -1,42 +1,69 @@
 """util functions for ddS"""
 
+import os
 import re
-import pydot
+import subprocess
+import tempfile
+from typing import Generator, Iterable, List
 from pysmt.formula import FNode
 from theorydd.util._utils import get_string_from_atom as _get_string_from_atom
 from theorydd.constants import *
 
 
-def change_bbd_dot_names(output_file, mapping):
-    """Changes the name in the dot file with the actual names of the atoms"""
-    dot_file = open(output_file, "r", encoding="utf8")
-    dot_lines = dot_file.readlines()
-    dot_output = """"""
+def rename_bdd_dot_lines(
+    dot_lines: Iterable[str], mapping
+) -> Generator[str, None, None]:
+    """Yields the lines of a BDD dot file with the actual names of the atoms"""
+
+    def _replace_label(found: re.Match) -> str:
+        return '[label="' + _get_string_from_atom(mapping[found.group(1)]) + '"]'
+
     for line in dot_lines:
-        found = re.search(BDD_DOT_LINE_REGEX, line)
-        if not found is None:
-            key_start_location = re.search(BDD_DOT_KEY_START_REGEX, line).start() + 1
-            key_end_location = re.search(BDD_DOT_KEY_END_REGEX, line).start()
-            line = re.sub(
-                BDD_DOT_REPLACE_REGEX,
-                '[label="'
-                + _get_string_from_atom(
-                    mapping[line[key_start_location:key_end_location]]
-                )
-                + '"]',
-                line,
-            )
-        dot_output += line
-    dot_file.close()
-    with open(output_file, "w", encoding="utf8") as out:
-        print(dot_output, file=out)
+        yield RE_BDD_DOT_LABEL.sub(_replace_label, line)
 
 
-def change_svg_names(output_file, mapping):
-    """Changes the names into the svg to match theory atoms' names"""
-    svg_file = open(output_file, "r", encoding="utf8")
-    svg_lines = svg_file.readlines()
-    svg_output = """"""
+def change_bbd_dot_names(output_file, mapping):
+    """Changes the name in the dot file with the actual names of the atoms
+
+    The file is rewritten line by line into a sibling file,
+    which then replaces the original one"""
+    rewritten_file = output_file + ".tmp"
+    with open(output_file, "r", encoding="utf8", buffering=1 << 20) as dot_file, open(
+        rewritten_file, "w", encoding="utf8", buffering=1 << 20
+    ) as out:
+        out.writelines(rename_bdd_dot_lines(dot_file, mapping))
+    os.replace(rewritten_file, output_file)
+
+
+def temporary_dot_file():
+    """Returns a named temporary dot file, which is deleted when closed
+
+    The file is kept in memory on /dev/shm when it is available"""
+    temporary_dir = "/dev/shm" if os.path.isdir("/dev/shm") else None
+    return tempfile.NamedTemporaryFile("w", suffix=".dot", dir=temporary_dir)
+
+
+def dot_file_to_svg(dot_file: str, output_file: str) -> None:
+    """Renders a dot file as svg by passing it directly to the Graphviz dot command"""
+    subprocess.run(["dot", "-Tsvg", dot_file, "-o", output_file], check=True)
+
+
+def dot_lines_to_svg(dot_lines: Iterable[str], output_file: str) -> None:
+    """Renders the lines of a dot graph as svg by streaming them to the Graphviz dot command"""
+    with subprocess.Popen(
+        ["dot", "-Tsvg", "-o", output_file], stdin=subprocess.PIPE, text=True
+    ) as dot_process:
+        dot_process.stdin.writelines(dot_lines)
+        dot_process.stdin.close()
+        return_code = dot_process.wait()
+    if return_code != 0:
+        raise subprocess.CalledProcessError(return_code, dot_process.args)
+
+
+def _rename_svg_lines(
+    svg_lines: Iterable[str], mapping
+) -> Generator[str, None, None]:
+    """Yields the lines of a BDD svg file with the actual names of the atoms"""
     for line in svg_lines:
         found = re.search(BDD_LINE_REGEX, line)
         if not found is None:
@@ -51,16 +78,27 @@ def change_svg_names(output_file, mapping):
                 + "<",
                 line,
             )
-        svg_output += line
-    svg_file.close()
-    with open(output_file, "w", encoding="utf8") as out:
-        print(svg_output, file=out)
+        yield line
+
+
+def change_svg_names(output_file, mapping):
+    """Changes the names into the svg to match theory atoms' names
+
+    The file is rewritten line by line into a sibling file,
+    which then replaces the original one"""
+    rewritten_file = output_file + ".tmp"
+    with open(output_file, "r", encoding="utf8", buffering=1 << 20) as svg_file, open(
+        rewritten_file, "w", encoding="utf8", buffering=1 << 20
+    ) as out:
+        out.writelines(_rename_svg_lines(svg_file, mapping))
+        out.write("\n")
+    os.replace(rewritten_file, output_file)
 
 
 def translate_vtree_vars(original_dot: str, mapping: dict[str, FNode]) -> str:
     """Translates variables in the dot representation
     of the VTree into their original names in phi"""
-    result = """"""
+    result: List[str] = []
     original_dot = original_dot.replace("width=.25", "width=.75")
     for line in original_dot.splitlines():
         found = re.search(VTREE_LINE_REGEX, line)
@@ -75,17 +113,14 @@ def translate_vtree_vars(original_dot: str, mapping: dict[str, FNode]) -> str:
                 + '",fontname=',
                 line,
             )
-        result += (
-            line
-            + """
-"""
-        )
-    return result
+        result.append(line)
+    # lines are joined once instead of growing a string line by line
+    return "".join(f"{line}\n" for line in result)
 
 
 def translate_sdd_vars(original_dot: str, mapping: dict[str, FNode]) -> str:
     """Translates variables in the dot representation of the SDD into their original names in phi"""
-    result = """"""
+    result: List[str] = []
     original_dot = original_dot.replace("fixedsize=true", "fixedsize=false")
     for line in original_dot.splitlines():
         new_line = line
@@ -138,12 +173,9 @@ def translate_sdd_vars(original_dot: str, mapping: dict[str, FNode]) -> str:
                 + '",',
                 new_line,
             )
-        result += (
-            new_line
-            + """
-"""
-        )
-    return result
+        result.append(new_line)
+    # lines are joined once instead of growing a string line by line
+    return "".join(f"{line}\n" for line in result)
 
 
 def save_sdd_object(
@@ -164,8 +196,9 @@ def save_sdd_object(
         with open(output_file, "w", encoding="utf8") as out:
             print(dot_content, file=out)
     elif tokenized_output_file[len(tokenized_output_file) - 1] == "svg":
-        (graph,) = pydot.graph_from_dot_data(dot_content)
-        graph.write_svg(output_file)
+        # the dot content is rendered directly by Graphviz,
+        # without parsing it into a pydot graph first
+        dot_lines_to_svg([dot_content], output_file)
     else:
         return False
     return True
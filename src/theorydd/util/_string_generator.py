@@ -1,6 +1,11 @@
 """this module defines an object that 
 sequantially generates strings of letters"""
 
+import itertools
+from typing import List
+
+_ALPHABET = "abcdefghijklmnopqrstuvwxyz"
+
 
 def _next_char(c: str) -> str:
     """returns the next character in the alphabet,
@@ -61,6 +66,27 @@ class SequentialStringGenerator:
         self._last_string = ""
 
 
+def generate_strings(amount: int) -> List[str]:
+    """generates in bulk the first strings produced by a SequentialStringGenerator
+
+    Args:
+        amount (int): the number of strings to generate
+
+    Returns:
+        List[str]: the first amount strings in sequential order
+    """
+    strings: List[str] = []
+    length = 1
+    while len(strings) < amount:
+        # the strings of each length follow the lexicographic order,
+        # which is the order in which itertools.product yields the letters
+        missing = amount - len(strings)
+        strings.extend(
+            map("".join, itertools.islice(itertools.product(_ALPHABET, repeat=length), missing))
+        )
+        length += 1
+    return strings
+
 if __name__ == "__main__":
     s = SequentialStringGenerator()
     for i in range(0, 1000000):
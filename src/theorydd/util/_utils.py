@@ -3,6 +3,7 @@
 import pickle
 from pysmt.fnode import FNode
 from dd import cudd as cudd_bdd
+from pysdd.sdd import SddManager, SddNode, WmcManager
 from theorydd.constants import VALID_SOLVER
 from theorydd.solvers.solver import SMTEnumerator
 from theorydd.solvers.mathsat_partial import MathSATPartialEnumerator
@@ -64,9 +65,11 @@ def cudd_load(file_name: str, bdd: cudd_bdd.BDD) -> cudd_bdd.Function:
     with open(pickle_fname, "rb") as f:
         d = pickle.load(f)
     order = d["variable_order"]
-    for var in order:
-        bdd.add_var(var)
-    cudd_bdd.reorder(bdd, order)
+    # declaring the variables by level already gives the saved order
+    # on a fresh manager, so CUDD is only asked to reorder when needed
+    bdd.declare(*sorted(order, key=order.__getitem__))
+    if any(bdd.level_of_var(var) != level for var, level in order.items()):
+        cudd_bdd.reorder(bdd, order)
     cfg = bdd.configure(reordering=False)
     u = bdd.load(dddmp_fname)
     bdd.configure(reordering=cfg["reordering"])
@@ -85,6 +88,31 @@ def cudd_dump(root: object, file_name: str) -> None:
     bdd.dump(dddmp_fname, [root])
 
 
+# SDD model counts are unsigned 64 bit integers,
+# so they are exact only on managers with fewer variables
+_SDD_MODEL_COUNT_MAX_VARS = 63
+
+
+def sdd_model_count(root: SddNode, manager: SddManager) -> int:
+    """Counts the models of an SDD over all the variables of its manager
+
+    Small managers are counted exactly by the SDD library without
+    allocating a WmcManager, bigger ones fall back to weighted model counting
+
+    Args:
+        root (SddNode): the root of the SDD
+        manager (SddManager): the manager of the SDD
+
+    Returns:
+        int: the amount of models of the SDD
+    """
+    if manager.var_count() <= _SDD_MODEL_COUNT_MAX_VARS:
+        return root.global_model_count()
+    wmc: WmcManager = root.wmc(log_mode=False)
+    # weighted model counting works on floats
+    return int(wmc.propagate())
+
+
 def get_solver(solver_name: str) -> SMTEnumerator:
     """Returns a SMTEnumerator object according to the solver name
 
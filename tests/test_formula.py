@@ -1,5 +1,7 @@
 """tests for module formula"""
 
+import time
+
 from pysmt.shortcuts import (
     Or,
     FALSE,
@@ -50,6 +52,16 @@ def test_big_and():
     ), "Big and should be the And of all the items"
 
 
+def test_serialization_round_trip():
+    """tests for formula.serialize_phi() and formula.deserialize_phi()"""
+    phi = formula.default_phi()
+    serialized = formula.serialize_phi(phi)
+    assert isinstance(serialized, str), "serialized phi should be a string"
+    assert (
+        formula.deserialize_phi(serialized) == phi
+    ), "deserializing a serialized phi should give back phi"
+
+
 def test_atom_diff():
     """tests for formula.atoms_difference()"""
     phi_atoms = [Symbol("A", BOOL), Symbol("B", BOOL)]
@@ -73,6 +85,65 @@ def test_atom_diff():
     ], "items missing in the second set should not be considered"
 
 
+def test_get_atoms_dfs_order():
+    """tests for formula.get_atoms_dfs_order()"""
+    phi = formula.default_phi()
+    ordered_atoms = formula.get_atoms_dfs_order(phi)
+    assert len(ordered_atoms) == len(
+        set(ordered_atoms)
+    ), "every atom should appear only once"
+    assert set(ordered_atoms) == set(
+        formula.get_atoms(phi)
+    ), "the ordered atoms should be the atoms of phi"
+    assert (
+        ordered_atoms[-1] == Symbol("b1", BOOL)
+    ), "the last argument of phi should be reached last"
+
+
+def test_get_atoms_min_fill_order():
+    """tests for formula.get_atoms_min_fill_order()"""
+    a, b, c, d = (Symbol(name, BOOL) for name in "abcd")
+    # a chain of clauses: a-b, b-c, c-d
+    phi = And(Or(a, b), Or(b, c), Or(c, d))
+    ordered_atoms = formula.get_atoms_min_fill_order(phi, [a, b, c, d])
+    assert sorted(ordered_atoms, key=str) == [
+        a,
+        b,
+        c,
+        d,
+    ], "the ordered atoms should be the atoms of phi, each once"
+    assert (
+        ordered_atoms[-1] == a
+    ), "a has no fill and comes first among ties, so it is eliminated first and placed last"
+    assert set(formula.get_atoms_min_fill_order(phi)) == set(
+        formula.get_atoms(phi)
+    ), "without given atoms, all the atoms of phi should be ordered"
+
+
+def test_get_atoms_min_fill_order_clique():
+    """tests that formula.get_atoms_min_fill_order() is fast when all the atoms interact"""
+    atoms = [Symbol(f"clique_{i}", BOOL) for i in range(300)]
+    # the top node is not an And, so all the atoms interact with each other
+    phi = Or(*atoms)
+    start_time = time.perf_counter()
+    ordered_atoms = formula.get_atoms_min_fill_order(phi, atoms)
+    assert time.perf_counter() - start_time < 1, "the ordering should return quickly"
+    assert ordered_atoms == atoms, "no atom adds fill, so the given order should be kept"
+
+
+def test_get_atoms_max_reduction_order():
+    """tests for formula.get_atoms_max_reduction_order()"""
+    x, y, z = (Symbol(name, BOOL) for name in "xyz")
+    phi = And(x, Or(y, z), Or(Not(y), z))
+    ordered_atoms = formula.get_atoms_max_reduction_order(phi, [x, y, z])
+    assert set(ordered_atoms) == {x, y, z} and len(
+        ordered_atoms
+    ) == 3, "the ordered atoms should be the atoms of phi, each once"
+    assert (
+        ordered_atoms[0] == z
+    ), "fixing z shrinks phi the most, so it should come first"
+
+
 def test_get_symbols():
     """tests for formula.get_symbols()"""
     phi = And(
@@ -184,3 +255,19 @@ def test_normalization():
     assert len(formula.get_atoms(normal)) < len(
         formula.get_atoms(phi)
     ), "equivalent atoms should be normalized into the same atom"
+
+
+def test_normalization_batch():
+    """tests for get_normalized_batch"""
+    solver = MathSATTotalEnumerator()
+    converter = solver.get_converter()
+    phis = [
+        LE(Symbol("X", REAL), Symbol("Y", REAL)),
+        Or(Symbol("F", BOOL), LE(Symbol("Y", REAL), Symbol("X", REAL))),
+        LE(Plus(Symbol("X", REAL), Times(Real(-1), Symbol("Y", REAL))), Real(0)),
+    ]
+    normals = formula.get_normalized_batch(phis, converter)
+    assert normals == [
+        formula.get_normalized(phi, converter) for phi in phis
+    ], "batch normalization should normalize each formula as get_normalized"
+    assert normals[0] == normals[2], "equivalent atoms should be normalized into the same atom"
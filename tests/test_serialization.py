@@ -1,5 +1,8 @@
 """Serialization tests for theorydd package"""
 
+import json
+
+from pysmt.shortcuts import And, LT, Not, Or, REAL, Symbol
 from theorydd.abstractdd.abstraction_bdd import AbstractionBDD, abstraction_bdd_load_from_folder
 from theorydd.abstractdd.abstraction_sdd import AbstractionSDD, abstraction_sdd_load_from_folder
 import theorydd.formula as formula
@@ -44,4 +47,42 @@ def test_theory_sdd_serialization():
 
     loaded_dd = tsdd_load_from_folder("tests/test_data/theory_sdd")
     assert len(original_dd) == len(loaded_dd), "Loaded SDD has different number of nodes"
-    assert original_dd.count_models() == loaded_dd.count_models(), "Loaded SDD has different number of models"
\ No newline at end of file
+    assert original_dd.count_models() == loaded_dd.count_models(), "Loaded SDD has different number of models"
+
+
+def _tbdd_with_qvars():
+    """returns a T-BDD built with a T-lemma that has a fresh T-atom"""
+    x, y, z = (Symbol(name, REAL) for name in ("X", "Y", "Z"))
+    phi = And(LT(x, y), LT(y, z))
+    # transitivity introduces X < Z, which does not appear in phi
+    tlemma = Or(Not(LT(x, y)), Not(LT(y, z)), LT(x, z))
+    tbdd = TheoryBDD(phi, tlemmas=[tlemma])
+    assert len(tbdd.qvars) == 1, "X < Z should be the only fresh T-atom"
+    return tbdd
+
+
+def test_qvars_serialization():
+    """tests that qvars are saved deterministically and loaded back"""
+    original_dd = _tbdd_with_qvars()
+    original_dd.save_to_folder("tests/test_data/theory_bdd_qvars")
+    with open("tests/test_data/theory_bdd_qvars/qvars.qvars", "rb") as qvars_file:
+        saved = qvars_file.read()
+    original_dd.save_to_folder("tests/test_data/theory_bdd_qvars")
+    with open("tests/test_data/theory_bdd_qvars/qvars.qvars", "rb") as qvars_file:
+        assert qvars_file.read() == saved, "the same qvars should be saved in the same file"
+
+    loaded_dd = tbdd_load_from_folder("tests/test_data/theory_bdd_qvars")
+    assert set(loaded_dd.qvars) == set(original_dd.qvars), "Loaded BDD has different qvars"
+    assert loaded_dd._get_qvar_labels() == original_dd._get_qvar_labels(), "Loaded BDD has different qvar labels"
+
+
+def test_qvars_legacy_json_loading():
+    """tests that qvars saved as JSON by previous versions are still loaded"""
+    original_dd = _tbdd_with_qvars()
+    original_dd.save_to_folder("tests/test_data/theory_bdd_legacy_qvars")
+    with open("tests/test_data/theory_bdd_legacy_qvars/qvars.qvars", "w", encoding="utf8") as qvars_file:
+        json.dump(list(original_dd._get_qvar_labels()), qvars_file)
+
+    loaded_dd = tbdd_load_from_folder("tests/test_data/theory_bdd_legacy_qvars")
+    assert set(loaded_dd.qvars) == set(original_dd.qvars), "Loaded BDD has different qvars"
+    assert original_dd.count_models() == loaded_dd.count_models(), "Loaded BDD has different number of models"
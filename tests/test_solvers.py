@@ -116,3 +116,16 @@ def test_t_lemmas_total():
     assert (
         len(solver.get_theory_lemmas()) > 0
     ), "T-lemmas should come for formula with conflicting T-atoms"
+
+
+def test_normalizer_reused_by_solver():
+    """tests that a solver normalizes all formulas with the same walker"""
+    solver = MathSATTotalEnumerator()
+    phi = LE(Symbol("X", REAL), Symbol("Y", REAL))
+    normalizer = solver.get_normalizer()
+    assert normalizer is solver.get_normalizer(), "the solver should reuse its normalizer"
+    normals = formula.get_normalized_batch([phi], solver.get_converter(), normalizer)
+    assert normals == [
+        formula.get_normalized(phi, solver.get_converter())
+    ], "the solver normalizer should normalize as formula.get_normalized"
+    assert normalizer.memoization.get(phi) == normals[0], "the walker of the solver should be used"
@@ -1,7 +1,12 @@
 """tests for T-BDDS"""
 
 from copy import deepcopy
-from theorydd.tdd.theory_bdd import TheoryBDD
+from theorydd.tdd.theory_bdd import (
+    TheoryBDD,
+    build_many,
+    build_tbdds_parallel,
+    tbdd_load_from_folder,
+)
 import theorydd.formula as formula
 from theorydd.solvers.mathsat_total import MathSATTotalEnumerator
 from theorydd.solvers.mathsat_partial_extended import MathSATExtendedPartialEnumerator
@@ -189,3 +194,178 @@ def test_lemma_loading_partial():
     assert (
         tbdd.count_models() == other_tbdd.count_models()
     ), "Same modles should come from different loading"
+
+
+def test_init_max_reduction_order():
+    """tests that the max-reduction ordering does not change the models of the T-BDD"""
+    phi = formula.read_phi("./tests/items/rng.smt")
+    tbdd = TheoryBDD(phi, solver=MathSATTotalEnumerator())
+    other_tbdd = TheoryBDD(
+        phi, solver=MathSATTotalEnumerator(), max_reduction_order=True
+    )
+    assert (
+        tbdd.count_models() == other_tbdd.count_models()
+    ), "The variable order should not change the models"
+
+
+def test_computation_logger_skipped_phases():
+    """tests that the phases that are not run are left as None in the computation logger"""
+    phi = And(
+        LT(Symbol("X", REAL), Symbol("Y", REAL)),
+        LT(Symbol("Y", REAL), Symbol("Zr", REAL)),
+        LT(Symbol("Zr", REAL), Symbol("X", REAL)),
+    )
+    logger = {}
+    TheoryBDD(phi, "partial", computation_logger=logger)
+    assert (
+        logger["T-BDD"]["variable ordering time"] is None
+    ), "the atoms of an UNSAT formula are not ordered"
+    assert logger["T-BDD"]["ALL SMT mode"] == "computed", "All-SMT should be computed"
+    assert isinstance(
+        logger["T-BDD"]["fresh T-atoms detected"], int
+    ), "the fresh T-atoms detected should be counted"
+    assert isinstance(
+        logger["T-BDD"]["phi normalization time"], float
+    ), "the normalization time should be recorded"
+
+
+def _decode_models_array(atoms, models):
+    """decodes the byte array of pick_all_array into a list of models"""
+    decoded = []
+    for start in range(0, len(models), len(atoms)):
+        decoded.append(
+            {
+                atom: bool(value)
+                for atom, value in zip(atoms, models[start : start + len(atoms)])
+                if value != 2
+            }
+        )
+    return decoded
+
+
+@pytest.mark.parametrize("phi", test_phi)
+def test_pick_all_array(phi):
+    """tests that pick_all_array packs the same models returned by pick_all"""
+    tbdd = TheoryBDD(phi, solver=MathSATTotalEnumerator())
+    atoms, models = tbdd.pick_all_array()
+    assert len(atoms) == len(set(atoms)), "each atom should have a single position"
+    assert set(models) <= {0, 1, 2}, "each position should be 0, 1 or 2"
+    if len(atoms) == 0:
+        assert len(models) == 0, "there is nothing to pack without atoms"
+        return
+    assert len(models) % len(atoms) == 0, "each model should take one byte per atom"
+    decoded = _decode_models_array(atoms, models)
+    expected = tbdd.pick_all()
+    assert len(decoded) == len(expected), "both should return the same number of models"
+    for model in expected:
+        assert model in decoded, "every model of pick_all should be packed"
+
+
+def test_pick_all_array_dont_care():
+    """tests that an atom that phi does not constrain takes both values in pick_all_array"""
+    atom = LT(Symbol("X", REAL), Symbol("Y", REAL))
+    phi = Or(atom, Not(atom))
+    tbdd = TheoryBDD(phi, solver=MathSATTotalEnumerator())
+    atoms, models = tbdd.pick_all_array()
+    assert len(atoms) == 1, "phi has a single atom"
+    assert sorted(models) == [0, 1], "the unconstrained atom should be both False and True"
+    assert sorted(
+        (model[atoms[0]] for model in _decode_models_array(atoms, models))
+    ) == sorted(
+        model[atoms[0]] for model in tbdd.pick_all()
+    ), "pick_all_array should match pick_all on the unconstrained atom"
+
+
+def _boolean_tbdd():
+    """returns the T-BDD of A | B | C and the labels of A, B and C"""
+    atoms = [Symbol(name) for name in ("A", "B", "C")]
+    tbdd = TheoryBDD(Or(*atoms), solver=MathSATTotalEnumerator())
+    return tbdd, [tbdd.abstraction[atom] for atom in atoms]
+
+
+def test_condition_list():
+    """tests conditioning over a list of labels, some of them negated"""
+    tbdd, (label_a, label_b, _label_c) = _boolean_tbdd()
+    assert tbdd.count_models() == 7, "A | B | C has 7 models"
+    tbdd.condition([label_a, "-" + label_b])
+    assert tbdd.count_models() == 2, "only C is left free"
+    for model in tbdd.pick_all():
+        assert model[Symbol("A")] and not model[Symbol("B")], "every model should satisfy the condition"
+
+
+def test_condition_cache():
+    """tests that a condition is parsed once and reused"""
+    tbdd, (label_a, _label_b, _label_c) = _boolean_tbdd()
+    tbdd.condition("-" + label_a)
+    cached = tbdd._condition_cache["-" + label_a]
+    assert label_a in tbdd._condition_cache, "the negated label should reuse the label"
+    tbdd.condition("-" + label_a)
+    assert (
+        tbdd._condition_cache["-" + label_a] is cached
+    ), "the condition should be taken from the cache"
+    assert tbdd.count_models() == 3, "B | C has 3 models"
+
+
+def test_condition_clears_cached_model_count():
+    """tests that conditioning clears the cached model count of the root"""
+    tbdd, (label_a, _label_b, _label_c) = _boolean_tbdd()
+    assert tbdd.count_models() == 7, "A | B | C has 7 models"
+    tbdd.condition("-" + label_a)
+    assert tbdd._cached_models is None, "the model count should be cleared"
+    assert tbdd.count_models() == 3, "B | C has 3 models"
+    assert len(tbdd) == len(tbdd.root), "the node count should follow the root"
+
+
+def test_condition_contradictory_literals():
+    """tests that conditioning over a label and its negation leaves no models"""
+    tbdd, (label_a, _label_b, _label_c) = _boolean_tbdd()
+    tbdd.condition([label_a, "-" + label_a])
+    assert not tbdd.is_sat(), "no model satisfies both A and not A"
+    assert tbdd.count_models() == 0, "no model satisfies both A and not A"
+
+
+def test_condition_literals_and_expressions():
+    """tests conditioning over a list mixing labels and expressions"""
+    tbdd, (label_a, label_b, label_c) = _boolean_tbdd()
+    tbdd.condition(["-" + label_a, f"{label_b} & ~ {label_c}"])
+    assert tbdd.count_models() == 1, "only B is True"
+    assert tbdd.pick_all() == [
+        {Symbol("A"): False, Symbol("B"): True, Symbol("C"): False}
+    ], "the only model should satisfy all the conditions"
+
+
+def _parallel_phis():
+    """returns two small independent formulas"""
+    return [
+        test_phi[0],
+        Or(
+            LT(Symbol("X", REAL), Symbol("Y", REAL)),
+            And(Symbol("A"), LT(Symbol("Y", REAL), Symbol("X", REAL))),
+        ),
+    ]
+
+
+def test_build_tbdds_parallel(tmp_path):
+    """tests that T-BDDs built in parallel match T-BDDs built one after another"""
+    phis = _parallel_phis()
+    folder_paths = [str(tmp_path / str(i)) for i in range(len(phis))]
+    loggers = build_tbdds_parallel(phis, folder_paths, solver="total", n_workers=2)
+    assert len(loggers) == len(phis), "there should be a computation logger for each phi"
+    for phi, folder_path in zip(phis, folder_paths):
+        sequential = TheoryBDD(phi, solver=MathSATTotalEnumerator())
+        parallel = tbdd_load_from_folder(folder_path)
+        assert (
+            parallel.count_models() == sequential.count_models()
+        ), "the T-BDD built in parallel should have the same models"
+
+
+def test_build_many():
+    """tests that build_many returns the T-BDDs in the order of the formulas"""
+    phis = _parallel_phis()
+    tbdds = build_many(phis, solver="total", workers=2, dynamic_reorder=False)
+    assert len(tbdds) == len(phis), "there should be a T-BDD for each phi"
+    for phi, tbdd in zip(phis, tbdds):
+        sequential = TheoryBDD(phi, solver=MathSATTotalEnumerator())
+        assert (
+            tbdd.count_models() == sequential.count_models()
+        ), "the T-BDD built by build_many should have the same models"
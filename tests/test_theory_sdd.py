@@ -2,6 +2,7 @@
 from copy import deepcopy
 
 from theorydd.tdd.theory_sdd import TheorySDD
+from theorydd.tdd.theory_dd import clear_lemmas_cache
 import theorydd.formula as formula
 from theorydd.solvers.mathsat_total import MathSATTotalEnumerator
 from theorydd.solvers.mathsat_partial_extended import MathSATExtendedPartialEnumerator
@@ -195,3 +196,48 @@ def test_lemma_loading_partial():
     assert (
         tbdd.count_models() == other_tbdd.count_models()
     ), "Same modles should come from different loading"
+
+
+def test_init_cached_lemmas():
+    """tests that a second T-SDD of the same phi with the same solver skips All-SMT"""
+    phi = formula.read_phi("./tests/items/rng.smt")
+    total = MathSATTotalEnumerator()
+    first_logger = {}
+    first_tsdd = TheorySDD(phi, solver=total, computation_logger=first_logger)
+    second_logger = {}
+    second_tsdd = TheorySDD(phi, solver=total, computation_logger=second_logger)
+    assert first_logger["T-SDD"]["ALL SMT mode"] == "computed", "All-SMT should be computed the first time"
+    assert second_logger["T-SDD"]["ALL SMT mode"] == "cached", "the lemmas should be taken from the cache"
+    assert (
+        "All-SMT computation time" not in second_logger["T-SDD"]
+    ), "All-SMT should not be computed again"
+    assert (
+        first_tsdd.count_models() == second_tsdd.count_models()
+    ), "both T-SDDs should have the same models"
+    assert len(first_tsdd) == len(second_tsdd), "both T-SDDs should have the same size"
+
+
+def test_clear_lemmas_cache():
+    """tests that All-SMT is computed again once the lemmas cache is cleared"""
+    phi = formula.read_phi("./tests/items/rng.smt")
+    total = MathSATTotalEnumerator()
+    TheorySDD(phi, solver=total)
+    clear_lemmas_cache(total)
+    logger = {}
+    TheorySDD(phi, solver=total, computation_logger=logger)
+    assert logger["T-SDD"]["ALL SMT mode"] == "computed", "the lemmas should be computed again"
+
+
+def test_count_models_int():
+    """tests that the model count is an int whether or not the root is constant"""
+    phi = Or(
+        LT(Symbol("X", REAL), Symbol("Y", REAL)),
+        LT(Symbol("Y", REAL), Symbol("Zr", REAL)),
+        LT(Symbol("Zr", REAL), Symbol("X", REAL)),
+    )
+    valid_phi = Or(
+        LT(Symbol("X", REAL), Symbol("Y", REAL)),
+        Not(LT(Symbol("X", REAL), Symbol("Y", REAL))),
+    )
+    assert isinstance(TheorySDD(phi, "total").count_models(), int), "the count should be an int"
+    assert isinstance(TheorySDD(valid_phi, "total").count_models(), int), "the count should be an int"
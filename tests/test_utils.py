@@ -2,7 +2,13 @@
 
 import random
 import string
+from pysdd.sdd import SddManager
+import pytest
 import theorydd.util._utils as utils
+from theorydd.util._string_generator import (
+    SequentialStringGenerator,
+    generate_strings,
+)
 
 
 def test_is_valid_solver():
@@ -14,3 +20,23 @@ def test_is_valid_solver():
     )
     assert not utils.is_valid_solver(rand_str), "random string sare not valid solvers"
     assert not utils.is_valid_solver(""), "Empty string is not a valid solver"
+
+
+def test_generate_strings():
+    """test for _string_generator.generate_strings()"""
+    generator = SequentialStringGenerator()
+    expected = [generator.next_string() for _ in range(1000)]
+    assert (
+        generate_strings(1000) == expected
+    ), "bulk generation should match the sequential generator"
+    assert generate_strings(0) == [], "no strings should be generated"
+
+
+@pytest.mark.parametrize("var_count", [3, 63, 64, 70])
+def test_sdd_model_count(var_count):
+    """test for _utils.sdd_model_count() on both sides of the exact counting limit"""
+    manager = SddManager(var_count=var_count)
+    root = manager.literal(1) | manager.literal(2)
+    assert (
+        utils.sdd_model_count(root, manager) == 3 * 2 ** (var_count - 2)
+    ), "x1 | x2 has 3 models over x1 and x2, and every other variable is free"